@@ -137,13 +137,15 @@ def validate_water_masking(original_path, masked_path):
         print(f"   ⚠️  Validation failed: {e}")
         return None
 
-def process_scenario_water_masking(scenario, validate=False):
+def process_scenario_water_masking(scenario, validate=False, land_mask_cache=None):
     """
     Process water masking for a single scenario
     
     Args:
         scenario: Name of the UK scenario
         validate: Whether to run validation checks
+        land_mask_cache: Optional dict shared across scenarios, so the land use
+            is warped to the dust grid only once
         
     Returns:
         bool: Success status
@@ -164,7 +166,8 @@ def process_scenario_water_masking(scenario, validate=False):
     try:
         # Apply water masking
         print(f"Applying water mask to: {original_path}")
-        result_path = apply_water_mask(original_path, masked_path, inputdir=".")
+        result_path = apply_water_mask(original_path, masked_path, inputdir=".",
+                                       land_mask_cache=land_mask_cache)
         
         if result_path != masked_path:
             # Move file if needed
@@ -243,13 +246,16 @@ def process_all_water_masking(validate=False):
     successful = []
     failed = []
     
+    # The scenarios share one grid, so the land mask is built once
+    land_mask_cache = {}
+    
     for i, scenario in enumerate(scenarios, 1):
         
         print(f"[{i}/{len(scenarios)}] Processing: {scenario}")
         print("-" * 60)
         
         try:
-            success = process_scenario_water_masking(scenario, validate)
+            success = process_scenario_water_masking(scenario, validate, land_mask_cache)
             
             if success:
                 successful.append(scenario)
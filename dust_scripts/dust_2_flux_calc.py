@@ -37,44 +37,31 @@ def run(inputdir):
             [soil_texture_path],
             [aligned_soil_texture],
             ['near'],
-            geop.get_raster_info(soc_raster_out)['pixel_size'],
-            bounding_box_mode=geop.get_raster_info(soc_raster_out)['bounding_box'],
-            target_projection_wkt=geop.get_raster_info(soc_raster_out)['projection_wkt'])
+            grid_info['pixel_size'],
+            bounding_box_mode=grid_info['bounding_box'],
+            target_projection_wkt=grid_info['projection_wkt'])
 
     # Note: these are the assignments [0 = 'MS', 1 = 'NA', 2 = 'FSS', 3 = 'FS', 4 = 'CS']
     # Create a functional that specifies a flux(ustar) dependent on the soil type
     # Here are the emission flux equations (units: g cm-2 s-1)
+    flux_coefficients = {
+        0: (1.243*(10.0 ** (-7)), 2.64),  # MS: F = 1.243 *10^-7 * ustar^2.64
+        2: (2.45*(10.0 ** (-6)), 3.97),   # FFS:F = 2.45 *10^-6 * ustar^3.97
+        3: (9.33*(10.0 ** (-7)), 2.44),   # FS: F = 9.33 *10^-7 * ustar^2.44
+        4: (1.243*(10.0 ** (-7)), 3.44),  # CS: F = 1.24 *10^-7 * ustar^3.44
+    }
+
     def flux(ustar, soiltype):
         # Round interpolated soil types to nearest integer for categorical data
-        soil_class = int(round(soiltype))
-
-        # MS: F = 1.243 *10^-7 * ustar^2.64
-        if soil_class == 0: #MS
-            return 1.243*(10.0 **(-7)) * ustar ** 2.64
-        elif soil_class == 1: #NA
-            return 0.0
-        # FFS:F = 2.45 *10^-6 * ustar^3.97
-        elif soil_class == 2: #FSS
-            return 2.45*(10.0 ** (-6)) * ustar ** 3.97
-        # FS: F = 9.33 *10^-7 * ustar^2.44
-        elif soil_class == 3: #FS
-            return 9.33*(10.0 ** (-7)) * ustar ** 2.44
-        # CS: F = 1.24 *10^-7 * ustar^3.44
-        elif soil_class == 4: #CS
-            return 1.243*(10.0 ** (-7)) * ustar ** 3.44
-        elif soil_class == -1: #NoData
-            return 0.0
-        else:
-            # Fallback for any unexpected values - conservative (no emissions)
-            return 0.0
-
-    flux_v = np.vectorize(flux)
-
-    # Create a function that multiplies two rasters together
-    def multiply_raster(x,y):
-        return x * y
+        soil_class = np.rint(soiltype)
 
-    multiply_raster_v = np.vectorize(multiply_raster)
+        # Whole blocks at once; NA (1), NoData (-1) and any unexpected values
+        # are left at 0 - conservative (no emissions)
+        flux_out = np.zeros(ustar.shape, dtype=np.float32)
+        for soil_value, (coefficient, exponent) in flux_coefficients.items():
+            soil_mask = soil_class == soil_value
+            flux_out[soil_mask] = coefficient * ustar[soil_mask] ** exponent
+        return flux_out
 
     ############################################################
     # 1         Effect of land cover
@@ -287,7 +274,16 @@ def run(inputdir):
         # This can be multiplied by the wind speed to get u*
         return result
 
-    z0_v = np.vectorize(z0)
+    # Land use codes are small integers, so evaluate z0 (and its math.log) once
+    # per code and gather per pixel instead of calling it for every pixel.
+    # Codes outside the table get no dust, as in z0's default case.
+    z0_lut = np.array([z0(lu) for lu in range(256)], dtype=np.float32)
+
+    def z0_v(lu):
+        if lu.dtype == np.uint8:
+            return z0_lut[lu]
+        in_table = (lu >= 0) & (lu < z0_lut.size)
+        return np.where(in_table, z0_lut[np.where(in_table, lu, 0).astype(np.intp)], 0.0)
 
     geop.raster_calculator(base_raster_path_band_const_list=lu_raster,
                                        local_op=z0_v,
@@ -317,9 +313,9 @@ def run(inputdir):
             [lu_raster_out],
             [aligned_z0_path],
             ['bilinear'],
-            geop.get_raster_info(soc_raster_out)['pixel_size'],
-            bounding_box_mode=geop.get_raster_info(soc_raster_out)['bounding_box'],
-            target_projection_wkt=geop.get_raster_info(soc_raster_out)['projection_wkt'])
+            grid_info['pixel_size'],
+            bounding_box_mode=grid_info['bounding_box'],
+            target_projection_wkt=grid_info['projection_wkt'])
 
     ############################################################
     # 2         Effect of Wind Speed
@@ -365,7 +361,8 @@ def run(inputdir):
         rows, cols = wind_speed.shape
         transform = from_origin(-180, 90, 0.625, 0.5)  # Adjust the resolution as needed
 
-        with rasterio.open(ws_raster_out, 'w', driver='GTiff', height=rows, width=cols, count=1, dtype='uint8', crs='+proj=latlong', transform=transform) as dst:
+        with rasterio.open(ws_raster_out, 'w', driver='GTiff', height=rows, width=cols, count=1, dtype='uint8', crs='+proj=latlong', transform=transform,
+                           compress='zstd', zstd_level=1, predictor=2, tiled=True, blockxsize=512, blockysize=512, num_threads='all_cpus') as dst:
             dst.write(wind_speed, 1)
 
         # align with aligned_z0_path and multiply to get u*. This would have to be changed to make it hourly (#TODO)
@@ -374,15 +371,15 @@ def run(inputdir):
                 [ws_raster_out],
                 [aligned_ws_path],
                 ['bilinear'],
-                geop.get_raster_info(soc_raster_out)['pixel_size'],
-                bounding_box_mode=geop.get_raster_info(soc_raster_out)['bounding_box'],
-                target_projection_wkt=geop.get_raster_info(soc_raster_out)['projection_wkt'])
+                grid_info['pixel_size'],
+                bounding_box_mode=grid_info['bounding_box'],
+                target_projection_wkt=grid_info['projection_wkt'])
 
         # Multiply with the z0 function to get ustar
         ustar_path               = f'intermediate/ustar_{date.strftime("%Y%m%d")}.tif'
         listraster_uri = [(aligned_ws_path,1),(aligned_z0_path,1)]
         geop.raster_calculator(base_raster_path_band_const_list=listraster_uri,
-                                           local_op=multiply_raster_v,
+                                           local_op=np.multiply,
                                            target_raster_path=ustar_path,
                                            datatype_target=gdal.GDT_Float32,
                                            nodata_target=-1,
@@ -392,7 +389,7 @@ def run(inputdir):
         flux_path                = f'intermediate/flux_{date.strftime("%Y%m%d")}.tif'
         listraster_ura = [(ustar_path,1),(aligned_soil_texture,1)]
         geop.raster_calculator(base_raster_path_band_const_list=listraster_ura,
-                                           local_op=flux_v,
+                                           local_op=flux,
                                            target_raster_path=flux_path,
                                            datatype_target=gdal.GDT_Float32,
                                            nodata_target=-1,
@@ -449,23 +446,20 @@ def run(inputdir):
 
             return emission_factor
 
-        # Vectorize the function for array operations
-        soil_moisture_suppression_v = np.vectorize(soil_moisture_suppression_factor)
-
         if hasattr(sm_data, 'mask'):
             # Handle masked array (SMOPS data has masked ocean areas)
             valid_data_mask = ~sm_data.mask  # True where data is valid (land areas)
 
             # Calculate suppression factor for valid land areas only
             suppression_factor = np.ones_like(sm_data.data, dtype=float)  # Default: no suppression
-            suppression_factor[valid_data_mask] = soil_moisture_suppression_v(sm_data.data[valid_data_mask])
+            suppression_factor[valid_data_mask] = soil_moisture_suppression_factor(sm_data.data[valid_data_mask])
             suppression_factor[~valid_data_mask] = 0.0  # Ocean areas: full suppression
 
             dry_pixels = np.sum(valid_data_mask & (suppression_factor > 0.5))  # Count pixels with >50% emissions remaining
             print(f"  Processed masked SMOPS data: {np.sum(valid_data_mask)} valid pixels, {dry_pixels} relatively dry pixels")
         else:
             # Handle regular array (fallback)
-            suppression_factor = soil_moisture_suppression_v(sm_data)
+            suppression_factor = soil_moisture_suppression_factor(sm_data)
             dry_pixels = np.sum(suppression_factor > 0.5)
             print(f"  Processed regular SMOPS data: {dry_pixels} relatively dry pixels")
 
@@ -474,7 +468,8 @@ def run(inputdir):
         rows, cols = suppression_factor.shape
         transform = from_origin(-180, 90, 0.25, 0.25)  # Adjust the resolution as needed
 
-        with rasterio.open(sm_raster_out, 'w', driver='GTiff', height=rows, width=cols, count=1, dtype='float32', crs='+proj=latlong', transform=transform) as dst:
+        with rasterio.open(sm_raster_out, 'w', driver='GTiff', height=rows, width=cols, count=1, dtype='float32', crs='+proj=latlong', transform=transform,
+                           compress='zstd', zstd_level=1, predictor=3, tiled=True, blockxsize=512, blockysize=512, num_threads='all_cpus') as dst:
             dst.write(suppression_factor, 1)
 
         # Align the sm_raster_out with the flux
@@ -484,15 +479,15 @@ def run(inputdir):
                 [sm_raster_out],
                 [sm_raster_aligned],
                 ['near'],
-                geop.get_raster_info(soc_raster_out)['pixel_size'],
-                bounding_box_mode=geop.get_raster_info(soc_raster_out)['bounding_box'],
-                target_projection_wkt=geop.get_raster_info(soc_raster_out)['projection_wkt'])
+                grid_info['pixel_size'],
+                bounding_box_mode=grid_info['bounding_box'],
+                target_projection_wkt=grid_info['projection_wkt'])
 
         # Multiply the flux by suppression factor (gradient suppression instead of binary mask)
         flux_masked_path               = f'intermediate/flux_masked_{date.strftime("%Y%m%d")}.tif'
         listraster_urp = [(sm_raster_aligned,1),(flux_path,1)]
         geop.raster_calculator(base_raster_path_band_const_list=listraster_urp,
-                                           local_op=multiply_raster_v,
+                                           local_op=np.multiply,
                                            target_raster_path=flux_masked_path,
                                            datatype_target=gdal.GDT_Float32,
                                            nodata_target=-1,
@@ -7,19 +7,203 @@ and smart caching for 4-8x performance improvement.
 """
 
 import multiprocessing
+from multiprocessing import shared_memory
 import os
+import sys
 from datetime import datetime, timedelta
-from functools import partial
+from itertools import repeat
 import pygeoprocessing.geoprocessing as geop
 from osgeo import gdal
 import math
 import numpy as np
 from netCDF4 import Dataset
 import rasterio
-from rasterio.transform import from_origin
+from rasterio.crs import CRS
+from rasterio.transform import Affine, from_origin
+from rasterio.warp import reproject, Resampling
 
-def setup_shared_resources(inputdir):
-    """Setup resources shared across all daily processing"""
+# Make the dust_scripts package importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dust_scripts.dust_flux_kernels import check_soil_texture, dust_flux, set_kernel_threads
+
+# GeoTIFF creation options: ZSTD level 1 is much cheaper to encode/decode than
+# LZW and 512x512 tiles avoid rewriting partial strips. The floating-point
+# predictor (3) is only valid for float rasters; integer rasters (soil texture,
+# dry masks) use horizontal differencing (2) instead.
+ZSTD_FLOAT_PROFILE = {
+    'compress': 'zstd',
+    'zstd_level': 1,
+    'predictor': 3,
+    'tiled': True,
+    'blockxsize': 512,
+    'blockysize': 512,
+    'num_threads': 'all_cpus',
+}
+
+# Same options in the form pygeoprocessing expects for raster_calculator /
+# align_and_resize_raster_stack outputs
+_ZSTD_CREATION_OPTIONS = (
+    'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=ZSTD', 'ZSTD_LEVEL=1',
+    'BLOCKXSIZE=512', 'BLOCKYSIZE=512', 'NUM_THREADS=ALL_CPUS')
+ZSTD_FLOAT_CREATION_TUPLE = ('GTIFF', _ZSTD_CREATION_OPTIONS + ('PREDICTOR=3',))
+ZSTD_INT_CREATION_TUPLE = ('GTIFF', _ZSTD_CREATION_OPTIONS + ('PREDICTOR=2',))
+
+# Optional quantized daily flux output: int16 with a per-file scale stored as
+# GDAL band scale metadata (half the bytes of float32). The largest flux of the
+# day maps to FLUX_INT16_MAX; the sum scripts apply the scale when reading.
+FLUX_INT16_MAX = 32000
+ZSTD_INT16_PROFILE = dict(ZSTD_FLOAT_PROFILE, predictor=2)
+
+# MERRA2 daily fields are on a regular lat/lon grid
+MERRA2_CRS = CRS.from_epsg(4326)
+
+def _quantize_flux(flux):
+    """Return (int16 array, scale) such that flux ~= array * scale"""
+    flux_max = float(flux.max())
+    scale = flux_max / FLUX_INT16_MAX if flux_max > 0 else 1.0
+    
+    return np.rint(flux / scale).astype(np.int16), scale
+
+# Shared-memory segments created by setup_shared_resources (parent process),
+# segments created by share_soil_texture that outlive a single run, and
+# segments attached by workers (cached so each day does not re-attach)
+_owned_segments = []
+_persistent_segments = []
+_attached_segments = {}
+
+def _share_array(array, segments=_owned_segments):
+    """Copy an array into shared memory and return its (name, shape, dtype) spec"""
+    shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    segments.append(shm)
+    
+    return (shm.name, array.shape, array.dtype.str)
+
+def _share_raster(raster_path, dtype, segments=_owned_segments):
+    """
+    Share band 1 of a raster (see _share_array), converted to dtype here in
+    the parent so worker views already match the flux kernel's signature
+    """
+    with rasterio.open(raster_path) as src:
+        return _share_array(src.read(1).astype(dtype, copy=False), segments)
+
+def _share_soil_texture(aligned_soil_texture, segments=_owned_segments):
+    """Validate the aligned soil texture and share it as the kernel's int32"""
+    with rasterio.open(aligned_soil_texture) as src:
+        soil_texture = src.read(1)
+    check_soil_texture(soil_texture)
+    
+    return _share_array(soil_texture.astype(np.int32, copy=False), segments)
+
+def _release_stale_attachments(specs):
+    """
+    Close segments attached by this worker that are not in specs, so a
+    persistent worker does not keep an earlier scenario's rasters mapped
+    """
+    keep = {spec[0] for spec in specs}
+    for name in list(_attached_segments):
+        if name not in keep:
+            _attached_segments.pop(name).close()
+
+def _attach_shared_array(spec):
+    """Return a read-only zero-copy view of an array shared by _share_array"""
+    name, shape, dtype = spec
+    
+    shm = _attached_segments.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached_segments[name] = shm
+    
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    array.flags.writeable = False
+    return array
+
+# Per-worker copies of the run-wide arguments, set once by _init_worker so
+# they are not pickled into every daily task
+_worker_shared_resources = None
+_worker_inputdir = None
+
+# GDAL settings applied once per worker: a larger block cache so the shared
+# aligned rasters stay warm across days, and no PROJ network lookups when
+# building coordinate transformations
+WORKER_GDAL_CONFIG = {
+    'GDAL_CACHEMAX': '512',
+    'PROJ_NETWORK': 'OFF',
+}
+
+def _configure_worker_gdal():
+    """
+    Pool initializer for create_worker_pool: configure GDAL once per worker,
+    and run the flux kernel single-threaded (the workers are the parallelism)
+    """
+    for key, value in WORKER_GDAL_CONFIG.items():
+        gdal.SetConfigOption(key, value)
+    set_kernel_threads(1)
+
+def _init_worker(shared_resources, inputdir):
+    """Pool initializer: configure GDAL and stash the run-wide arguments in the worker process"""
+    global _worker_shared_resources, _worker_inputdir
+    _configure_worker_gdal()
+    _worker_shared_resources = shared_resources
+    _worker_inputdir = inputdir
+
+def _process_day_task(date_info):
+    """Pool task: process one day with the arguments stashed by _init_worker"""
+    return process_single_day(date_info, _worker_shared_resources, _worker_inputdir)
+
+def _process_day_with_resources_task(task):
+    """
+    Pool task for a persistent pool: process one day with the run-wide
+    arguments sent along with it (they change from one scenario to the next)
+    """
+    date_info, shared_resources, inputdir = task
+    _release_stale_attachments([shared_resources['z0_shm'], shared_resources['soil_texture_shm']])
+    return process_single_day(date_info, shared_resources, inputdir)
+
+def create_worker_pool(num_processes=None):
+    """
+    Create a worker pool that several run_parallel calls can share (pass it
+    as run_parallel(pool=...)), so a multi-scenario batch starts its worker
+    processes, and imports numpy, rasterio and GDAL in them, only once.
+    The caller closes it (e.g. with a with-block).
+    """
+    if num_processes is None:
+        num_processes = min(multiprocessing.cpu_count(), 8)  # Cap to avoid I/O contention
+    
+    return multiprocessing.Pool(processes=num_processes, initializer=_configure_worker_gdal)
+
+def release_shared_resources(include_persistent=False):
+    """
+    Free the shared-memory segments created by setup_shared_resources, and
+    also those from share_soil_texture if include_persistent is set
+    """
+    segment_lists = [_owned_segments, _persistent_segments] if include_persistent else [_owned_segments]
+    for segments in segment_lists:
+        while segments:
+            shm = segments.pop()
+            shm.close()
+            shm.unlink()
+
+def share_soil_texture(aligned_soil_texture="intermediate/aligned_soil_texture.tif"):
+    """
+    Validate the aligned soil texture and copy it into shared memory once
+    
+    Soil texture does not depend on the land use scenario, so a caller running
+    several scenarios can share it for the whole batch and pass the returned
+    spec to run_parallel(soil_texture_shm=...), instead of every run decoding
+    and validating the GeoTIFF again. Free it with
+    release_shared_resources(include_persistent=True).
+    """
+    return _share_soil_texture(aligned_soil_texture, segments=_persistent_segments)
+
+def setup_shared_resources(inputdir, soil_texture_shm=None):
+    """
+    Setup resources shared across all daily processing
+    
+    soil_texture_shm is an optional spec from share_soil_texture; the aligned
+    soil texture is validated and shared here when it is not given.
+    """
     
     wdir = "./"
     
@@ -38,7 +222,8 @@ def setup_shared_resources(inputdir):
             ['bilinear'],
             grid_info['pixel_size'],
             bounding_box_mode=grid_info['bounding_box'],
-            target_projection_wkt=grid_info['projection_wkt'])
+            target_projection_wkt=grid_info['projection_wkt'],
+            raster_driver_creation_tuple=ZSTD_INT_CREATION_TUPLE)
     
     # Setup land use effect (scenario-specific but shared across days)
     lu_raster = [(os.path.join(inputdir,'inputs', 'gblulcg20_10000.tif'),1)]
@@ -89,7 +274,16 @@ def setup_shared_resources(inputdir):
             result = fdtf / (2.5 * math.log(1000.0/k))
             return result
         
-        z0_v = np.vectorize(z0)
+        # Land use codes are small integers, so evaluate z0 (and its math.log) once
+        # per code and gather per pixel instead of calling it for every pixel.
+        # Codes outside the table get no dust, as in z0's default case.
+        z0_lut = np.array([z0(lu) for lu in range(256)], dtype=np.float32)
+
+        def z0_v(lu):
+            if lu.dtype == np.uint8:
+                return z0_lut[lu]
+            in_table = (lu >= 0) & (lu < z0_lut.size)
+            return np.where(in_table, z0_lut[np.where(in_table, lu, 0).astype(np.intp)], 0.0)
         
         geop.raster_calculator(
             base_raster_path_band_const_list=lu_raster,
@@ -97,7 +291,8 @@ def setup_shared_resources(inputdir):
             target_raster_path=lu_raster_out,
             datatype_target=gdal.GDT_Float32,
             nodata_target=-1,
-            calc_raster_stats=False)
+            calc_raster_stats=False,
+            raster_driver_creation_tuple=ZSTD_FLOAT_CREATION_TUPLE)
     
     # Align z0 with grid
     aligned_z0_path = os.path.join(wdir, 'intermediate', 'aligned_z0.tif')
@@ -108,12 +303,27 @@ def setup_shared_resources(inputdir):
             ['bilinear'],
             grid_info['pixel_size'],
             bounding_box_mode=grid_info['bounding_box'],
-            target_projection_wkt=grid_info['projection_wkt'])
+            target_projection_wkt=grid_info['projection_wkt'],
+            raster_driver_creation_tuple=ZSTD_FLOAT_CREATION_TUPLE)
     
+    # Soil texture is static, so validate its classes once rather than per day
+    if soil_texture_shm is None:
+        soil_texture_shm = _share_soil_texture(aligned_soil_texture)
+    
+    # Static across all days: decode the aligned rasters once and hand workers
+    # shared-memory views instead of re-reading the GeoTIFFs every day. They
+    # are stored as the flux kernel's float32/int32, so dust_flux uses the
+    # views as they are rather than copying them in every worker. The grid
+    # CRS and transform are also built once here rather than re-parsed from the
+    # WKT/geotransform on every warp and write.
     return {
         'grid_info': grid_info,
         'aligned_soil_texture': aligned_soil_texture,
         'aligned_z0_path': aligned_z0_path,
+        'soil_texture_shm': soil_texture_shm,
+        'z0_shm': _share_raster(aligned_z0_path, np.float32),
+        'grid_crs': CRS.from_wkt(grid_info['projection_wkt']),
+        'grid_transform': Affine.from_gdal(*grid_info['geotransform']),
         'wdir': wdir
     }
 
@@ -127,13 +337,14 @@ def process_single_day(date_info, shared_resources, inputdir):
         inputdir: Input directory path
         
     Returns:
-        str: Path to processed flux file
+        str: Path to processed flux file (or "<store>[<day index>]" when
+        writing to a Zarr flux store)
     """
     
     date, date_string = date_info
     grid_info = shared_resources['grid_info']
-    aligned_soil_texture = shared_resources['aligned_soil_texture']
-    aligned_z0_path = shared_resources['aligned_z0_path']
+    grid_crs = shared_resources['grid_crs']
+    grid_transform = shared_resources['grid_transform']
     wdir = shared_resources['wdir']
     
     try:
@@ -152,108 +363,91 @@ def process_single_day(date_info, shared_resources, inputdir):
             wind_speed = np.sqrt(np.square(east_wind) + np.square(north_wind))
             wind_speed = np.flipud(wind_speed)
         
-        # 2. Create wind speed raster
-        wind_speed_path = os.path.join(wdir, 'intermediate', f'ws_{date_string}.tif')
-        
-        with rasterio.open(wind_speed_path, 'w', 
-                          driver='GTiff',
-                          height=wind_speed.shape[0],
-                          width=wind_speed.shape[1],
-                          count=1,
-                          dtype=wind_speed.dtype,
-                          crs='EPSG:4326',
-                          transform=from_origin(-180, 90, 0.625, 0.5),
-                          compress='lzw') as dst:
-            dst.write(wind_speed, 1)
-        
-        # 3. Align wind speed to processing grid
-        aligned_ws_path = os.path.join(wdir, 'intermediate', f'ws_aligned_{date_string}.tif')
-        geop.align_and_resize_raster_stack(
-            [wind_speed_path],
-            [aligned_ws_path],
-            ['bilinear'],
-            grid_info['pixel_size'],
-            bounding_box_mode=grid_info['bounding_box'],
-            target_projection_wkt=grid_info['projection_wkt'])
-        
-        # 4. Calculate ustar (friction velocity)
-        ustar_path = os.path.join(wdir, 'intermediate', f'ustar_{date_string}.tif')
-        
-        def multiply_raster(ws, z0_effect):
-            return ws * z0_effect
-        
-        multiply_raster_v = np.vectorize(multiply_raster)
-        
-        listraster = [(aligned_ws_path, 1), (aligned_z0_path, 1)]
-        geop.raster_calculator(
-            base_raster_path_band_const_list=listraster,
-            local_op=multiply_raster_v,
-            target_raster_path=ustar_path,
-            datatype_target=gdal.GDT_Float32,
-            nodata_target=-1,
-            calc_raster_stats=False)
-        
-        # 5. Calculate dust flux
-        def flux(ustar, soiltype):
-            if soiltype == 0: return 1.243*(10.0 **(-7)) * ustar ** 2.64  # MS
-            elif soiltype == 1: return 0.0  # NA
-            elif soiltype == 2: return 2.45*(10.0 ** (-6)) * ustar ** 3.97  # FSS
-            elif soiltype == 3: return 9.33*(10.0 ** (-7)) * ustar ** 2.44  # FS
-            elif soiltype == 4: return 1.243*(10.0 ** (-7)) * ustar ** 3.44  # CS
-            elif soiltype == -1: return 0.0  # NoData
-            else: raise ValueError("soil type not recognized")
+        # 2. Warp wind speed straight from the netCDF array onto the processing
+        # grid (no intermediate ws_<date>.tif write/read/delete)
+        grid_width, grid_height = grid_info['raster_size']
         
-        flux_v = np.vectorize(flux)
+        aligned_ws = np.zeros((grid_height, grid_width), dtype=np.float32)
+        reproject(
+            source=np.asarray(wind_speed, dtype=np.float32),
+            destination=aligned_ws,
+            src_transform=from_origin(-180, 90, 0.625, 0.5),
+            src_crs=MERRA2_CRS,
+            dst_transform=grid_transform,
+            dst_crs=grid_crs,
+            resampling=Resampling.bilinear)
         
-        flux_path = os.path.join(wdir, 'intermediate', f'flux_{date_string}.tif')
-        listraster = [(ustar_path, 1), (aligned_soil_texture, 1)]
-        geop.raster_calculator(
-            base_raster_path_band_const_list=listraster,
-            local_op=flux_v,
-            target_raster_path=flux_path,
-            datatype_target=gdal.GDT_Float32,
-            nodata_target=-1,
-            calc_raster_stats=False)
-        
-        # 6. Apply soil moisture masking
+        # 3. Align soil moisture (if available) to the processing grid
         smops_path = os.path.join(inputdir, 'inputs', 'daily_meteorology', f'sm_{date_string}.tif')
+        has_sm = os.path.exists(smops_path)
         
-        if os.path.exists(smops_path):
-            # Align soil moisture
-            aligned_sm_path = os.path.join(wdir, 'intermediate', f'sm_aligned_{date_string}.tif')
+        aligned_sm_path = os.path.join(wdir, 'intermediate', f'sm_aligned_{date_string}.tif')
+        if has_sm:
             geop.align_and_resize_raster_stack(
                 [smops_path],
                 [aligned_sm_path],
                 ['bilinear'],
                 grid_info['pixel_size'],
                 bounding_box_mode=grid_info['bounding_box'],
-                target_projection_wkt=grid_info['projection_wkt'])
-            
-            # Apply moisture mask
-            def mask_by_sm(flux_val, sm_val):
-                if sm_val >= 20.0:  # High soil moisture suppresses dust
-                    return 0.0
-                else:
-                    return flux_val
+                target_projection_wkt=grid_info['projection_wkt'],
+                raster_driver_creation_tuple=ZSTD_INT_CREATION_TUPLE)
+        
+        # 4-5. Calculate ustar (friction velocity) and dust flux (g cm-2 s-1)
+        # in one pass over the shared z0 effect and soil texture
+        z0_effect = _attach_shared_array(shared_resources['z0_shm'])
+        soil_texture = _attach_shared_array(shared_resources['soil_texture_shm'])
+        
+        flux = dust_flux(aligned_ws, z0_effect, soil_texture)
+        
+        # 6. Apply soil moisture masking (high soil moisture suppresses dust)
+        if has_sm:
+            with rasterio.open(aligned_sm_path) as src:
+                sm = src.read(1)
+            flux_masked = np.where(sm >= 20.0, 0.0, flux).astype(np.float32)
+        
+        flux_store_path = shared_resources.get('flux_store_path')
+        if flux_store_path is not None:
+            # Write the day into the shared (day, y, x) store. Days without soil
+            # moisture are left at zero, matching the GeoTIFF path where they
+            # never produce a flux_masked file for dust_3_sum to pick up.
+            import zarr
+            day_index = (date - shared_resources['flux_store_start']).days
+            if has_sm:
+                zarr.open(flux_store_path, mode='r+')[day_index] = flux_masked
+            flux_masked_path = f"{flux_store_path}[{day_index}]"
+        else:
+            if has_sm:
+                flux_masked_path = os.path.join(wdir, 'intermediate', f'flux_masked_{date_string}.tif')
+                flux_output = flux_masked
+            else:
+                # No soil moisture data available
+                flux_masked_path = os.path.join(wdir, 'intermediate', f'flux_{date_string}.tif')
+                flux_output = flux
             
-            mask_by_sm_v = np.vectorize(mask_by_sm)
+            if shared_resources.get('quantize_flux'):
+                flux_output, flux_scale = _quantize_flux(flux_output)
+                output_dtype, output_profile = 'int16', ZSTD_INT16_PROFILE
+            else:
+                flux_scale = None
+                output_dtype, output_profile = 'float32', ZSTD_FLOAT_PROFILE
             
-            flux_masked_path = os.path.join(wdir, 'intermediate', f'flux_masked_{date_string}.tif')
-            listraster = [(flux_path, 1), (aligned_sm_path, 1)]
-            geop.raster_calculator(
-                base_raster_path_band_const_list=listraster,
-                local_op=mask_by_sm_v,
-                target_raster_path=flux_masked_path,
-                datatype_target=gdal.GDT_Float32,
-                nodata_target=-1,
-                calc_raster_stats=False)
-        else:
-            # No soil moisture data available
-            flux_masked_path = flux_path
+            with rasterio.open(flux_masked_path, 'w',
+                              driver='GTiff',
+                              height=grid_height,
+                              width=grid_width,
+                              count=1,
+                              dtype=output_dtype,
+                              nodata=-1,
+                              crs=grid_crs,
+                              transform=grid_transform,
+                              **output_profile) as dst:
+                dst.write(flux_output, 1)
+                if flux_scale is not None:
+                    dst.scales = (flux_scale,)
         
         # 7. Cleanup intermediate daily files to save disk space
-        cleanup_files = [wind_speed_path, aligned_ws_path, ustar_path]
-        if os.path.exists(smops_path):
+        cleanup_files = []
+        if has_sm:
             cleanup_files.extend([aligned_sm_path])
         
         for cleanup_file in cleanup_files:
@@ -266,23 +460,36 @@ def process_single_day(date_info, shared_resources, inputdir):
         print(f"  ❌ Error processing {date_string}: {e}")
         return None
 
-def run_parallel(inputdir, num_processes=None):
+def run_parallel(inputdir, num_processes=None, flux_store_path=None, quantize_flux=False,
+                 soil_texture_shm=None, pool=None):
     """
     Run parallelized dust flux calculation
     
     Args:
         inputdir: Input directory path
         num_processes: Number of parallel processes (default: CPU count)
+        flux_store_path: Optional Zarr store path. When given, daily masked
+            fluxes go into one (day, y, x) store instead of flux_masked_*.tif
+            files; sum it with dust_3_sum.run(inputdir, flux_store=...)
+        quantize_flux: Write daily GeoTIFFs as scaled int16 instead of float32
+            (relative precision ~1/32000 of each day's maximum flux)
+        soil_texture_shm: Optional shared soil texture from share_soil_texture,
+            for callers running several scenarios (left for the caller to free)
+        pool: Optional persistent pool from create_worker_pool, reused instead
+            of starting new worker processes (num_processes is then ignored)
     """
     
-    if num_processes is None:
-        num_processes = min(multiprocessing.cpu_count(), 8)  # Cap to avoid I/O contention
-    
-    print(f"🚀 Starting parallelized dust processing with {num_processes} processes")
+    if pool is not None:
+        print(f"🚀 Starting parallelized dust processing on the shared worker pool")
+    else:
+        if num_processes is None:
+            num_processes = min(multiprocessing.cpu_count(), 8)  # Cap to avoid I/O contention
+        
+        print(f"🚀 Starting parallelized dust processing with {num_processes} processes")
     
     # Setup shared resources once
     print("📋 Setting up shared resources...")
-    shared_resources = setup_shared_resources(inputdir)
+    shared_resources = setup_shared_resources(inputdir, soil_texture_shm)
     
     # Create date range for 2021
     start_date = datetime(2021, 5, 2)  # Match original start date
@@ -297,17 +504,37 @@ def run_parallel(inputdir, num_processes=None):
     
     print(f"📅 Processing {len(date_list)} days from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
     
-    # Create partial function with fixed arguments
-    process_day_partial = partial(process_single_day, 
-                                  shared_resources=shared_resources, 
-                                  inputdir=inputdir)
+    shared_resources['quantize_flux'] = quantize_flux
+    
+    if flux_store_path is not None:
+        from dust_scripts.dust_flux_sum import create_flux_store
+        
+        grid_width, grid_height = shared_resources['grid_info']['raster_size']
+        create_flux_store(flux_store_path, len(date_list), (grid_height, grid_width),
+                          shared_resources['grid_transform'],
+                          shared_resources['grid_info']['projection_wkt'])
+        shared_resources['flux_store_path'] = flux_store_path
+        shared_resources['flux_store_start'] = start_date
+        print(f"🗄️  Writing daily fluxes to Zarr store: {flux_store_path}")
     
     # Process days in parallel
     print(f"⚡ Starting parallel processing...")
     start_time = datetime.now()
     
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        results = pool.map(process_day_partial, date_list)
+    # Days are handed out in small chunks and collected as they finish. A new
+    # pool gets shared_resources once per worker via the initializer; a shared
+    # pool's workers outlive this run, so it is sent along with each day
+    try:
+        if pool is not None:
+            tasks = zip(date_list, repeat(shared_resources), repeat(inputdir))
+            results = list(pool.imap_unordered(_process_day_with_resources_task, tasks, chunksize=4))
+        else:
+            with multiprocessing.Pool(processes=num_processes,
+                                      initializer=_init_worker,
+                                      initargs=(shared_resources, inputdir)) as run_pool:
+                results = list(run_pool.imap_unordered(_process_day_task, date_list, chunksize=4))
+    finally:
+        release_shared_resources()
     
     end_time = datetime.now()
     processing_time = (end_time - start_time).total_seconds()
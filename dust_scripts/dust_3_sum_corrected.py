@@ -1,10 +1,10 @@
 def run(inputdir):
     import os
-    import glob
     import datetime
     import rasterio
     import numpy as np
     import math
+    from dust_scripts.dust_flux_sum import find_flux_files, scale_to_float32, sum_flux_files
 
     # Define the start and end date
     start_date = datetime.datetime(2021, 1, 1)
@@ -16,59 +16,43 @@ def run(inputdir):
     # Define the output TIFF file
     output_tiff = "./outputs/dust_sum.tiff"
 
-    # Initialize variables
-    sum_of_tiffs = None
-    reference_transform = None
-    reference_crs = None
-
     print("Summing dust flux files with dynamic pixel area calculation...")
 
-    # Loop through TIFF files within the specified date range
-    file_count = 0
-    for file_path in glob.glob(os.path.join(input_folder, 'flux_masked_*.tif')):
-        file_date = datetime.datetime.strptime(os.path.basename(file_path).split('_')[-1].split('.')[0], "%Y%m%d")
+    # Collect TIFF files within the specified date range
+    flux_files = find_flux_files(input_folder, start_date, end_date)
+
+    # Sum the files in parallel shards
+    sum_of_tiffs, reference_transform, reference_crs = sum_flux_files(flux_files)
+    file_count = len(flux_files)
+
+    if sum_of_tiffs is not None:
+        # Calculate actual pixel area from geotransform
+        pixel_width = abs(reference_transform[0])  # degrees
+        pixel_height = abs(reference_transform[4])  # degrees
+        
+        print(f"  Detected pixel size: {pixel_width:.6f}° × {pixel_height:.6f}°")
+        
+        # Calculate pixel area in cm²
+        # Convert degrees to meters first, then to cm
+        center_lat = 55.0  # Approximate center latitude for UK
+        
+        # Conversion factors: degrees to meters
+        lat_to_m = 111000  # meters per degree latitude
+        lon_to_m = 111000 * math.cos(math.radians(center_lat))  # longitude varies by latitude
         
-        if start_date <= file_date <= end_date:
-            with rasterio.open(file_path, 'r') as src:
-                if sum_of_tiffs is None:
-                    # Initialize the sum with the first TIFF file
-                    sum_of_tiffs = src.read(1).astype(np.float64)  # Use float64 for precision
-                    reference_transform = src.transform
-                    reference_crs = src.crs
-                    
-                    # Calculate actual pixel area from geotransform
-                    pixel_width = abs(reference_transform[0])  # degrees
-                    pixel_height = abs(reference_transform[4])  # degrees
-                    
-                    print(f"  Detected pixel size: {pixel_width:.6f}° × {pixel_height:.6f}°")
-                    
-                    # Calculate pixel area in cm²
-                    # Convert degrees to meters first, then to cm
-                    center_lat = 55.0  # Approximate center latitude for UK
-                    
-                    # Conversion factors: degrees to meters
-                    lat_to_m = 111000  # meters per degree latitude
-                    lon_to_m = 111000 * math.cos(math.radians(center_lat))  # longitude varies by latitude
-                    
-                    # Pixel area in m², then convert to cm²
-                    pixel_area_m2 = (pixel_width * lon_to_m) * (pixel_height * lat_to_m)
-                    pixel_area_cm2 = pixel_area_m2 * 10000  # m² to cm²
-                    
-                    print(f"  Calculated pixel area: {pixel_area_m2:,.0f} m² ({pixel_area_cm2:,.0f} cm²)")
-                    
-                    # Time conversion: seconds per day
-                    seconds_per_day = 86400
-                    
-                    # Full conversion factor: g cm⁻² s⁻¹ × cm² × s day⁻¹ × day → g → kg
-                    conversion_factor = pixel_area_cm2 * seconds_per_day / 1000  # grams to kg
-                    
-                    print(f"  Conversion factor (g cm⁻² s⁻¹ to kg day⁻¹): {conversion_factor:,.0f}")
-                    
-                else:
-                    # Add the data from the current TIFF file to the sum
-                    sum_of_tiffs += src.read(1).astype(np.float64)
-                    
-                file_count += 1
+        # Pixel area in m², then convert to cm²
+        pixel_area_m2 = (pixel_width * lon_to_m) * (pixel_height * lat_to_m)
+        pixel_area_cm2 = pixel_area_m2 * 10000  # m² to cm²
+        
+        print(f"  Calculated pixel area: {pixel_area_m2:,.0f} m² ({pixel_area_cm2:,.0f} cm²)")
+        
+        # Time conversion: seconds per day
+        seconds_per_day = 86400
+        
+        # Full conversion factor: g cm⁻² s⁻¹ × cm² × s day⁻¹ × day → g → kg
+        conversion_factor = pixel_area_cm2 * seconds_per_day / 1000  # grams to kg
+        
+        print(f"  Conversion factor (g cm⁻² s⁻¹ to kg day⁻¹): {conversion_factor:,.0f}")
 
     print(f"  Processed {file_count} daily flux files")
 
@@ -77,10 +61,10 @@ def run(inputdir):
         print("  Applying area normalization and unit conversion...")
         
         # Apply conversion: flux (g cm⁻² s⁻¹) → total emission (kg)
-        sum_of_tiffs = sum_of_tiffs * conversion_factor
+        sum_of_tiffs = scale_to_float32(sum_of_tiffs, conversion_factor)
         
         print(f"  Total emission before conversion: sum of raw flux values")
-        print(f"  Total emission after conversion: {np.sum(sum_of_tiffs[sum_of_tiffs > 0]):,.0f} kg")
+        print(f"  Total emission after conversion: {np.sum(sum_of_tiffs, where=sum_of_tiffs > 0, dtype=np.float64):,.0f} kg")
 
         # Create a TIFF file for the sum
         with rasterio.open(output_tiff, 'w', 
@@ -91,8 +75,10 @@ def run(inputdir):
                           dtype='float32', 
                           crs=reference_crs,
                           transform=reference_transform,
-                          compress='lzw') as dst:
-            dst.write(sum_of_tiffs.astype(np.float32), 1)
+                          compress='zstd', zstd_level=1, predictor=3,
+                          tiled=True, blockxsize=512, blockysize=512,
+                          num_threads='all_cpus') as dst:
+            dst.write(sum_of_tiffs, 1)
 
         print(f"✅ Corrected dust emissions saved to '{output_tiff}'")
         
@@ -114,9 +100,9 @@ def run(inputdir):
             f.write("EMISSION RESULTS:\n")
             f.write("-" * 30 + "\n")
             valid_emissions = sum_of_tiffs[sum_of_tiffs > 0]
-            f.write(f"Total emission: {np.sum(valid_emissions):,.0f} kg\n")
+            f.write(f"Total emission: {np.sum(valid_emissions, dtype=np.float64):,.0f} kg\n")
             f.write(f"Maximum pixel emission: {np.max(valid_emissions):,.0f} kg\n")
-            f.write(f"Mean pixel emission: {np.mean(valid_emissions):,.0f} kg\n")
+            f.write(f"Mean pixel emission: {np.mean(valid_emissions, dtype=np.float64):,.0f} kg\n")
             f.write(f"Emitting pixels: {len(valid_emissions):,}\n\n")
             
             f.write("CORRECTION APPLIED:\n")
@@ -132,4 +118,9 @@ def run(inputdir):
         print("❌ No TIFF files found within the specified date range.")
 
 if __name__ == "__main__":
+    import os
+    import sys
+
+    # Make the dust_scripts package importable when run as a script
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     run(".")
\ No newline at end of file
@@ -1,9 +1,9 @@
-def run(inputdir):
+def run(inputdir, output_tiff="./outputs/dust_sum_resolution_corrected.tiff"):
     import os
-    import glob
     import datetime
     import rasterio
     import numpy as np
+    from dust_scripts.dust_flux_sum import find_flux_files, scale_to_float32, sum_flux_files
 
     # Define the start and end date
     start_date = datetime.datetime(2021, 1, 1)
@@ -12,37 +12,21 @@ def run(inputdir):
     # Define the input folder containing the TIFF files
     input_folder = "intermediate"
 
-    # Define the output TIFF file
-    output_tiff = "./outputs/dust_sum_resolution_corrected.tiff"
-
-    # Initialize variables
-    sum_of_tiffs = None
-    reference_transform = None
-    reference_crs = None
+    # The output TIFF file (e.g. straight into a scenario's results folder)
+    output_tiff = str(output_tiff)
 
     print("Summing dust flux files with resolution correction...")
 
-    # Loop through TIFF files within the specified date range
-    file_count = 0
-    for file_path in glob.glob(os.path.join(input_folder, 'flux_masked_*.tif')):
-        file_date = datetime.datetime.strptime(os.path.basename(file_path).split('_')[-1].split('.')[0], "%Y%m%d")
-        
-        if start_date <= file_date <= end_date:
-            with rasterio.open(file_path, 'r') as src:
-                if sum_of_tiffs is None:
-                    # Initialize the sum with the first TIFF file
-                    sum_of_tiffs = src.read(1).astype(np.float64)  # Use float64 for precision
-                    reference_transform = src.transform
-                    reference_crs = src.crs
-                    
-                    print(f"  Processing flux files generated with resolution correction")
-                    print(f"  Flux units: g/pixel/s (already area-corrected)")
-                    
-                else:
-                    # Add the data from the current TIFF file to the sum
-                    sum_of_tiffs += src.read(1).astype(np.float64)
-                    
-                file_count += 1
+    # Collect TIFF files within the specified date range
+    flux_files = find_flux_files(input_folder, start_date, end_date)
+
+    # Sum the files in parallel shards
+    sum_of_tiffs, reference_transform, reference_crs = sum_flux_files(flux_files)
+    file_count = len(flux_files)
+
+    if sum_of_tiffs is not None:
+        print(f"  Processing flux files generated with resolution correction")
+        print(f"  Flux units: g/pixel/s (already area-corrected)")
 
     print(f"  Processed {file_count} daily flux files")
 
@@ -53,8 +37,8 @@ def run(inputdir):
         seconds_per_day = 86400
         
         # Convert: g/pixel/s → kg/pixel/day → kg total
-        sum_of_tiffs_kg = sum_of_tiffs * seconds_per_day / 1000  # g/pixel/day → kg/pixel/day
-        total_emissions_kg = np.sum(sum_of_tiffs_kg[sum_of_tiffs_kg > 0])
+        sum_of_tiffs_kg = scale_to_float32(sum_of_tiffs, seconds_per_day / 1000)  # g/pixel/day → kg/pixel/day
+        total_emissions_kg = np.sum(sum_of_tiffs_kg, where=sum_of_tiffs_kg > 0, dtype=np.float64)
         
         print(f"  Total emission (resolution-corrected): {total_emissions_kg:,.0f} kg")
 
@@ -67,13 +51,15 @@ def run(inputdir):
                           dtype='float32', 
                           crs=reference_crs,
                           transform=reference_transform,
-                          compress='lzw') as dst:
-            dst.write(sum_of_tiffs_kg.astype(np.float32), 1)
+                          compress='zstd', zstd_level=1, predictor=3,
+                          tiled=True, blockxsize=512, blockysize=512,
+                          num_threads='all_cpus') as dst:
+            dst.write(sum_of_tiffs_kg, 1)
 
         print(f"✅ Resolution-corrected dust emissions saved to '{output_tiff}'")
         
         # Create a summary file
-        summary_path = output_tiff.replace('.tiff', '_summary.txt')
+        summary_path = os.path.splitext(output_tiff)[0] + '_summary.txt'
         with open(summary_path, 'w') as f:
             f.write("Dust Emissions Calculation Summary (Resolution-Corrected)\\n")
             f.write("=" * 60 + "\\n\\n")
@@ -93,7 +79,7 @@ def run(inputdir):
             valid_emissions = sum_of_tiffs_kg[sum_of_tiffs_kg > 0]
             f.write(f"Total emission: {total_emissions_kg:,.0f} kg\\n")
             f.write(f"Maximum pixel emission: {np.max(valid_emissions):,.2f} kg/day\\n")
-            f.write(f"Mean pixel emission: {np.mean(valid_emissions):,.2f} kg/day\\n")
+            f.write(f"Mean pixel emission: {np.mean(valid_emissions, dtype=np.float64):,.2f} kg/day\\n")
             f.write(f"Emitting pixels: {len(valid_emissions):,}\\n\\n")
             
             f.write("CORRECTIONS APPLIED:\\n")
@@ -109,4 +95,9 @@ def run(inputdir):
         print("❌ No TIFF files found within the specified date range.")
 
 if __name__ == "__main__":
+    import os
+    import sys
+
+    # Make the dust_scripts package importable when run as a script
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     run(".")
\ No newline at end of file
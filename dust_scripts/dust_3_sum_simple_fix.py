@@ -1,9 +1,15 @@
-def run(inputdir):
+def run(inputdir, accumulator_path=None):
+    """
+    Sum daily dust fluxes for 2021 into outputs/dust_sum.tiff (kg per pixel)
+
+    Args:
+        inputdir: Input directory path
+        accumulator_path: Optional scratch file backing the running sum with
+            np.memmap, for grids too large to sum in memory
+    """
     import os
-    import glob
     import datetime
-    import rasterio
-    import numpy as np
+    from dust_scripts.dust_flux_sum import find_flux_files, sum_flux_files, write_scaled_sum
 
     # Define the start and end date
     start_date = datetime.datetime(2021, 1, 1)
@@ -15,25 +21,12 @@ def run(inputdir):
     # Define the output TIFF file
     output_tiff = "./outputs/dust_sum.tiff"
 
-    # Initialize variables
-    sum_of_tiffs = None
-    reference_transform = None
-    reference_crs = None
+    # Collect TIFF files within the specified date range
+    flux_files = find_flux_files(input_folder, start_date, end_date)
 
-    # Loop through TIFF files within the specified date range
-    for file_path in glob.glob(os.path.join(input_folder, 'flux_masked_*.tif')):
-        file_date = datetime.datetime.strptime(os.path.basename(file_path).split('_')[-1].split('.')[0], "%Y%m%d")
-        
-        if start_date <= file_date <= end_date:
-            with rasterio.open(file_path, 'r') as src:
-                if sum_of_tiffs is None:
-                    # Initialize the sum with the first TIFF file
-                    sum_of_tiffs = src.read(1).astype(np.float64)
-                    reference_transform = src.transform
-                    reference_crs = src.crs
-                else:
-                    # Add the data from the current TIFF file to the sum
-                    sum_of_tiffs += src.read(1).astype(np.float64)
+    # Sum the files in parallel shards
+    sum_of_tiffs, reference_transform, reference_crs = sum_flux_files(
+        flux_files, accumulator_path=accumulator_path)
 
     if sum_of_tiffs is not None:
         # SIMPLE FIX: Calculate actual pixel area instead of using hardcoded 0.05°
@@ -51,24 +44,11 @@ def run(inputdir):
         print(f"Corrected conversion factor ({pixel_width_deg:.6f}° pixels): {conversion_factor:,.0f}")
         print(f"Ratio (should be ~324): {conversion_factor / (0.05*0.05*11100000.0*11100000.0*86400/1000):.1f}")
 
-        # Apply the conversion: g cm⁻² s⁻¹ → kg total
-        sum_of_tiffs_kg = sum_of_tiffs * conversion_factor
-        
-        # Calculate total emissions
-        total_emissions = np.sum(sum_of_tiffs_kg[sum_of_tiffs_kg > 0])
+        # Apply the conversion (g cm⁻² s⁻¹ → kg total) while writing the TIFF
+        total_emissions = write_scaled_sum(sum_of_tiffs, conversion_factor, output_tiff,
+                                           reference_transform, reference_crs)
         print(f"Total dust emissions: {total_emissions:,.0f} kg")
 
-        # Create a TIFF file for the sum
-        with rasterio.open(output_tiff, 'w', 
-                          driver='GTiff', 
-                          height=sum_of_tiffs_kg.shape[0],
-                          width=sum_of_tiffs_kg.shape[1], 
-                          count=1, 
-                          dtype='float32', 
-                          crs=reference_crs,
-                          transform=reference_transform) as dst:
-            dst.write(sum_of_tiffs_kg.astype(np.float32), 1)
-
         print(f"✅ Sum of TIFF files saved to '{output_tiff}'")
     else:
         print("No TIFF files found within the specified date range.")
\ No newline at end of file
@@ -4,20 +4,58 @@ Dust Processing Cache Manager
 
 Implements smart caching for meteorology and shared resources to dramatically
 speed up multi-scenario processing.
+
+Files are hardlinked into and out of the cache where possible, so caching and
+restoring cost no extra disk space or copy time. This relies on the pipeline
+writing rasters as new files (GDAL/rasterio delete an existing target before
+creating it) rather than updating them in place.
 """
 
 import os
 import glob
+import functools
 import shutil
 from pathlib import Path
 from datetime import datetime
 import hashlib
 
+def _link_or_copy(src, dst):
+    """
+    Hardlink src to dst, falling back to a copy across filesystems
+
+    An existing dst is removed first, so a file that is itself a link into
+    the cache is replaced rather than written through.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+@functools.lru_cache(maxsize=64)
+def _grid_cache_key(grid_file, mtime_ns, size):
+    """
+    Hash the grid's size, pixel size and bounding box into a cache key
+
+    Memoized on the file's path, mtime and size, so the grid is only opened
+    again when it changes.
+    """
+    import pygeoprocessing.geoprocessing as geop
+    
+    grid_info = geop.get_raster_info(grid_file)
+    properties = f"{grid_info['raster_size']}_{grid_info['pixel_size']}_{grid_info['bounding_box']}"
+    cache_key = hashlib.md5(properties.encode()).hexdigest()[:16]
+    return f"grid_{cache_key}"
+
 class DustProcessingCache:
     """
     Manages caching for dust processing to optimize multi-scenario runs
     """
     
+    __slots__ = ('cache_dir', 'meteorology_cache', 'soil_cache', 'grid_cache')
+    
     def __init__(self, cache_dir="cache/dust/"):
         self.cache_dir = Path(cache_dir)
         self.meteorology_cache = self.cache_dir / "meteorology"
@@ -43,10 +81,18 @@ class DustProcessingCache:
         
         # Check for expected number of files (daily files from May 2 - Dec 31)
         # That's 244 days × 2 files (wind + soil moisture) = 488 files minimum
-        cached_files = list(cache_path.glob("*.tif"))
         expected_min_files = 400  # Conservative estimate
-        
-        return len(cached_files) >= expected_min_files
+
+        # Count directory entries without stat-ing each one, stopping early
+        cached_count = 0
+        with os.scandir(cache_path) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tif"):
+                    cached_count += 1
+                    if cached_count >= expected_min_files:
+                        return True
+
+        return False
     
     def cache_meteorology(self, source_dir="intermediate/daily_meteorology/", year=2021):
         """Cache meteorology data for reuse across scenarios"""
@@ -73,7 +119,7 @@ class DustProcessingCache:
             for src_file in file_list:
                 dst_file = cache_path / src_file.name
                 if not dst_file.exists():
-                    shutil.copy2(src_file, dst_file)
+                    _link_or_copy(src_file, dst_file)
                     cached_count += 1
         
         print(f"  ✅ Cached {cached_count} meteorology files to: {cache_path}")
@@ -98,7 +144,7 @@ class DustProcessingCache:
         for src_file in cached_files:
             dst_file = target_path / src_file.name
             if not dst_file.exists():
-                shutil.copy2(src_file, dst_file)
+                _link_or_copy(src_file, dst_file)
                 restored_count += 1
         
         print(f"  ✅ Restored {restored_count} cached meteorology files")
@@ -123,7 +169,7 @@ class DustProcessingCache:
         cache_key = self.get_soil_cache_key()
         cache_path = self.soil_cache / f"{cache_key}.tif"
         
-        shutil.copy2(source_file, cache_path)
+        _link_or_copy(source_file, cache_path)
         print(f"  ✅ Cached soil texture: {cache_path}")
         return True
     
@@ -139,7 +185,7 @@ class DustProcessingCache:
         # Ensure target directory exists
         os.makedirs(os.path.dirname(target_file), exist_ok=True)
         
-        shutil.copy2(cache_path, target_file)
+        _link_or_copy(cache_path, target_file)
         print(f"  ✅ Restored cached soil texture: {target_file}")
         return True
     
@@ -150,13 +196,9 @@ class DustProcessingCache:
             return None
         
         # Create hash based on grid file properties
-        import pygeoprocessing.geoprocessing as geop
-        
         try:
-            grid_info = geop.get_raster_info(grid_file)
-            properties = f"{grid_info['raster_size']}_{grid_info['pixel_size']}_{grid_info['bounding_box']}"
-            cache_key = hashlib.md5(properties.encode()).hexdigest()[:16]
-            return f"grid_{cache_key}"
+            grid_stat = os.stat(grid_file)
+            return _grid_cache_key(grid_file, grid_stat.st_mtime_ns, grid_stat.st_size)
         except:
             return None
     
@@ -183,7 +225,7 @@ class DustProcessingCache:
             if os.path.exists(src_path):
                 cache_file = scenario_cache / cache_name
                 if force or not cache_file.exists():
-                    shutil.copy2(src_path, cache_file)
+                    _link_or_copy(src_path, cache_file)
                     cached_count += 1
         
         if cached_count > 0:
@@ -221,7 +263,7 @@ class DustProcessingCache:
             if cache_file.exists():
                 # Ensure target directory exists
                 os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                shutil.copy2(cache_file, target_path)
+                _link_or_copy(cache_file, target_path)
                 restored_count += 1
         
         if restored_count > 0:
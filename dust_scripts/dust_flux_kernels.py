@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Dust Flux Kernels
+
+Per-pixel dust flux from wind speed, the land use z0 effect and soil texture:
+
+    ustar = wind_speed * z0_effect
+    flux  = a * ustar ** b          (a, b by soil texture class, g cm-2 s-1)
+
+The compiled kernel looks up (a, b) by class from small tables so the
+per-pixel work has no branches. dust_flux_masked also applies a daily mask
+in the same pass.
+
+The kernel is compiled with Numba when it is installed. It is declared with
+an explicit signature, so it is compiled (or loaded from the on-disk cache,
+cache=True) when this module is imported rather than on the first call.
+Forked worker processes inherit it ready to run; spawned ones (the default
+on macOS) load it from the cache when they import this module. Without
+Numba the same calculation runs as NumPy array ops.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange, set_num_threads, types
+except ImportError:  # Numba is optional
+    njit = None
+
+# Soil texture classes: [0 = 'MS', 1 = 'NA', 2 = 'FSS', 3 = 'FS', 4 = 'CS'], -1 = NoData
+SOIL_CLASSES = (-1, 0, 1, 2, 3, 4)
+
+# Emission flux coefficients (a, b) for F = a * ustar ** b; NA and NoData emit nothing
+FLUX_COEFFICIENTS = {
+    0: (1.243*(10.0 ** (-7)), 2.64),  # MS
+    2: (2.45*(10.0 ** (-6)), 3.97),   # FSS
+    3: (9.33*(10.0 ** (-7)), 2.44),   # FS
+    4: (1.243*(10.0 ** (-7)), 3.44),  # CS
+}
+
+# (a, b) tables indexed by soil class + 1, so NoData (-1) and NA (1) hit zeros
+_COEFFICIENT_LUT = np.zeros(len(SOIL_CLASSES))
+_EXPONENT_LUT = np.zeros(len(SOIL_CLASSES))
+for _soiltype, (_coefficient, _exponent) in FLUX_COEFFICIENTS.items():
+    _COEFFICIENT_LUT[_soiltype + 1] = _coefficient
+    _EXPONENT_LUT[_soiltype + 1] = _exponent
+
+def _dust_flux_numpy(wind_speed, z0_effect, soil_texture, out):
+    """NumPy fallback for the flux kernel"""
+
+    # Pixels outside the land use data (z0 nodata = -1) get no ustar
+    ustar = np.where(z0_effect > 0, wind_speed * z0_effect, 0.0).astype(np.float32)
+
+    out[:] = 0.0
+    for soiltype, (coefficient, exponent) in FLUX_COEFFICIENTS.items():
+        soil_mask = soil_texture == soiltype
+        out[soil_mask] = coefficient * ustar[soil_mask] ** exponent
+
+    return out
+
+if njit is not None:
+    # Inputs are typed read-only so shared-memory views are accepted; writable
+    # arrays convert to read-only types implicitly
+    _FLUX_SIGNATURE = types.float32[:, ::1](
+        types.Array(types.float32, 2, 'C', readonly=True),  # wind speed
+        types.Array(types.float32, 2, 'C', readonly=True),  # z0 effect
+        types.Array(types.int32, 2, 'C', readonly=True),    # soil texture
+        types.Array(types.uint8, 2, 'A', readonly=True),    # mask (any strides)
+        types.Array(types.float64, 1, 'C', readonly=True),  # coefficients
+        types.Array(types.float64, 1, 'C', readonly=True),  # exponents
+        types.float32[:, ::1])                              # out
+
+    @njit(_FLUX_SIGNATURE, cache=True, parallel=True, fastmath=True)
+    def _dust_flux_numba(wind_speed, z0_effect, soil_texture, mask, coefficients, exponents, out):
+        """Single fused pass over the grid, rows split across threads"""
+
+        rows, cols = wind_speed.shape
+        for i in prange(rows):
+            for j in range(cols):
+                z0 = z0_effect[i, j]
+                if z0 <= 0.0:
+                    out[i, j] = 0.0
+                    continue
+
+                # Branchless (a, b) lookup; NA and NoData have a = 0
+                class_index = soil_texture[i, j] + 1
+                out[i, j] = (mask[i, j] * coefficients[class_index]
+                             * (wind_speed[i, j] * z0) ** exponents[class_index])
+
+        return out
+
+def _run_flux_kernel(wind_speed, z0_effect, soil_texture, mask, out=None):
+    """Call the compiled kernel, or the NumPy fallback, with a uint8 mask"""
+
+    if out is None:
+        out = np.empty(wind_speed.shape, dtype=np.float32)
+
+    if njit is not None:
+        # Match the compiled signature (copies only if dtype/layout differ)
+        return _dust_flux_numba(np.ascontiguousarray(wind_speed, dtype=np.float32),
+                                np.ascontiguousarray(z0_effect, dtype=np.float32),
+                                np.ascontiguousarray(soil_texture, dtype=np.int32),
+                                np.asarray(mask, dtype=np.uint8),
+                                _COEFFICIENT_LUT, _EXPONENT_LUT, out)
+
+    _dust_flux_numpy(wind_speed, z0_effect, soil_texture, out)
+    np.multiply(out, mask, out=out, casting='unsafe')
+    return out
+
+def dust_flux(wind_speed, z0_effect, soil_texture):
+    """
+    Calculate dust flux (g cm-2 s-1) for aligned 2D arrays
+
+    Args:
+        wind_speed: Wind speed at 10 m (m/s)
+        z0_effect: Land use z0 effect (multiplies wind speed to give ustar)
+        soil_texture: Soil texture class per pixel (see SOIL_CLASSES)
+
+    Returns:
+        np.ndarray: float32 flux array
+    """
+
+    # A zero-stride mask of ones costs no memory and stays in cache
+    no_mask = np.broadcast_to(np.uint8(1), wind_speed.shape)
+    return _run_flux_kernel(wind_speed, z0_effect, soil_texture, no_mask)
+
+def dust_flux_masked(wind_speed, z0_effect, soil_texture, mask, out=None):
+    """
+    Dust flux multiplied by a 0/1 mask (e.g. the daily dry soil moisture mask)
+
+    The compiled kernel reads the mask in the same pass as the other inputs,
+    so each pixel's inputs are loaded together and the flux is written once.
+    out is an optional C-contiguous float32 array to write the flux into
+    (e.g. one buffer reused for every block), instead of a new array.
+
+    Returns:
+        np.ndarray: float32 masked flux array (out, if given)
+    """
+
+    return _run_flux_kernel(wind_speed, z0_effect, soil_texture, mask, out)
+
+def check_soil_texture(soil_texture):
+    """Raise ValueError if the soil texture raster has unrecognized classes"""
+
+    if not np.isin(soil_texture, SOIL_CLASSES).all():
+        raise ValueError("soil type not recognized")
+
+def set_kernel_threads(num_threads):
+    """
+    Limit the threads the compiled kernel splits rows across in this process
+
+    For worker processes that already run in parallel with each other, so
+    the machine is not oversubscribed with one full Numba thread pool per
+    worker. Does nothing without Numba.
+    """
+
+    if njit is not None:
+        set_num_threads(num_threads)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Parallel Summation of Daily Dust Flux Rasters
+
+Shared by the dust_3_sum* scripts. The daily flux_masked_*.tif files are split
+into shards, each worker sums its shard into a float64 accumulator, and the
+parent adds the partial sums together (the sum is associative, so the result
+matches the serial loop up to floating-point rounding).
+
+The parallel flux calculation can instead write every day into a single
+(day, y, x) Zarr store; create_flux_store/sum_flux_store handle that layout
+so the sum is a chunked read rather than one GeoTIFF open per day. Zarr is
+only imported when a store is used.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import repeat
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+def find_flux_files(input_folder, start_date, end_date):
+    """
+    List flux_masked_YYYYMMDD.tif files within [start_date, end_date], in date order
+
+    The file names are deterministic, so each day's path is built directly and
+    checked, rather than listing the folder and parsing every name.
+    """
+
+    flux_files = []
+    for day in range((end_date - start_date).days + 1):
+        date = start_date + timedelta(days=day)
+        file_path = os.path.join(input_folder, f'flux_masked_{date:%Y%m%d}.tif')
+        if os.path.exists(file_path):
+            flux_files.append(file_path)
+
+    return flux_files
+
+# Rows per band read from each file, the most files held open at once (keeps
+# well below per-process open-file limits), and the reader threads per worker
+# (GDAL releases the GIL while reading and decoding, so reads of different
+# files overlap). Each worker holds one band per reader thread, so its
+# memory is READ_THREADS x BAND_ROWS x width float32 whatever the file count.
+BAND_ROWS = 512
+MAX_OPEN_FILES = 64
+READ_THREADS = 4
+
+def _sum_shard(file_paths):
+    """
+    Sum band 1 of each raster in a shard into a float64 array
+
+    Files are read band by band, READ_THREADS at a time and concurrently
+    (one dataset per read), into a small preallocated (READ_THREADS, rows,
+    width) float32 stack. Each batch is reduced with one sum(axis=0) and
+    added into the float64 running sum, so only a few bands are held at once.
+    Files written as scaled int16 are converted back to flux with their band
+    scale as they are read.
+    """
+
+    with rasterio.open(file_paths[0], 'r') as src:
+        height, width = src.height, src.width
+
+    shard_sum = np.zeros((height, width), dtype=np.float64)
+    band_rows = min(BAND_ROWS, height)
+    batch_size = min(READ_THREADS, len(file_paths))
+    stack = np.empty((batch_size, band_rows, width), dtype=np.float32)
+    band_buffer = np.empty((band_rows, width), dtype=np.float32)
+    read_buffers = {}  # per (stack slot, dtype), so concurrent reads never share one
+
+    def read_band(i, src, window, band_stack):
+        rows = band_stack.shape[1]
+        if src.dtypes[0] == 'float32':
+            src.read(1, window=window, out=band_stack[i])
+        else:
+            # Read into a reused buffer of the file's dtype, then cast into the
+            # stack (no per-file, per-band allocation)
+            read_buffer = read_buffers.get((i, src.dtypes[0]))
+            if read_buffer is None:
+                read_buffer = np.empty((band_rows, width), dtype=src.dtypes[0])
+                read_buffers[(i, src.dtypes[0])] = read_buffer
+            src.read(1, window=window, out=read_buffer[:rows])
+            band_stack[i] = read_buffer[:rows]
+
+        # Quantized (int16) flux files carry their scale in the band metadata
+        if src.scales[0] != 1.0:
+            band_stack[i] *= src.scales[0]
+
+    with ThreadPoolExecutor(max_workers=READ_THREADS) as executor:
+        for group_start in range(0, len(file_paths), MAX_OPEN_FILES):
+            group = file_paths[group_start:group_start + MAX_OPEN_FILES]
+            datasets = [rasterio.open(file_path, 'r') for file_path in group]
+
+            try:
+                for row_start in range(0, height, band_rows):
+                    rows = min(band_rows, height - row_start)
+                    window = Window(0, row_start, width, rows)
+
+                    for batch_start in range(0, len(datasets), batch_size):
+                        batch = datasets[batch_start:batch_start + batch_size]
+                        band_stack = stack[:len(batch), :rows, :]
+
+                        list(executor.map(read_band, range(len(batch)), batch,
+                                          repeat(window), repeat(band_stack)))
+
+                        # At most READ_THREADS terms per pixel are added in
+                        # float32; the running shard sum stays float64
+                        band_sum = np.sum(band_stack, axis=0, out=band_buffer[:rows])
+                        shard_sum[row_start:row_start + rows] += band_sum
+            finally:
+                for src in datasets:
+                    src.close()
+
+    return shard_sum
+
+def sum_flux_files(file_paths, num_processes=None, accumulator_path=None):
+    """
+    Sum daily flux rasters using a pool of workers
+
+    Args:
+        file_paths: List of flux raster paths (all on the same grid)
+        num_processes: Number of worker processes (default: CPU count, capped at 8)
+        accumulator_path: Optional file to back the float64 total with
+            np.memmap, so the parent does not hold it in RAM (for grids too
+            large to keep several full-size arrays in memory)
+
+    Returns:
+        tuple: (float64 sum array, reference transform, reference crs), or
+        (None, None, None) if file_paths is empty
+    """
+
+    if not file_paths:
+        return None, None, None
+
+    with rasterio.open(file_paths[0], 'r') as src:
+        reference_transform = src.transform
+        reference_crs = src.crs
+        shape = (src.height, src.width)
+
+    if num_processes is None:
+        num_processes = min(multiprocessing.cpu_count(), 8)  # Cap to avoid I/O contention
+    num_processes = max(1, min(num_processes, len(file_paths)))
+
+    if num_processes == 1 and accumulator_path is None:
+        return _sum_shard(file_paths), reference_transform, reference_crs
+
+    if accumulator_path is None:
+        total = np.zeros(shape, dtype=np.float64)
+    else:
+        total = np.memmap(accumulator_path, dtype=np.float64, mode='w+', shape=shape)
+
+    if num_processes == 1:
+        total += _sum_shard(file_paths)
+    else:
+        # Interleave files across shards so each worker gets a similar share
+        shards = [file_paths[i::num_processes] for i in range(num_processes)]
+
+        # Fold shard sums in as they are returned (in shard order, so the
+        # result is reproducible) rather than holding all of them at once
+        with multiprocessing.Pool(processes=num_processes) as pool:
+            for shard_sum in pool.imap(_sum_shard, shards):
+                total += shard_sum
+
+    if accumulator_path is not None:
+        total.flush()
+
+    return total, reference_transform, reference_crs
+
+def scale_to_float32(total, factor):
+    """
+    Multiply the float64 flux sum by a scalar unit-conversion factor and cast to
+    float32 in one pass (no intermediate full-size float64 product)
+    """
+
+    return np.multiply(total, factor, out=np.empty(total.shape, dtype=np.float32),
+                       casting='same_kind')
+
+def write_scaled_sum(total, factor, output_path, transform, crs):
+    """
+    Convert the float64 flux sum with a scalar factor and write it as a
+    float32 GeoTIFF, one band of rows at a time
+
+    Each band is multiplied and cast into one reused float32 buffer and
+    written straight out, so no full-size float32 copy of the raster is made.
+
+    Returns:
+        float: Sum of the positive converted values (total emissions)
+    """
+
+    height, width = total.shape
+    band_rows = min(BAND_ROWS, height)
+    band_buffer = np.empty((band_rows, width), dtype=np.float32)
+    positive_total = 0.0
+
+    with rasterio.open(output_path, 'w',
+                       driver='GTiff',
+                       height=height,
+                       width=width,
+                       count=1,
+                       dtype='float32',
+                       crs=crs,
+                       transform=transform,
+                       compress='zstd', zstd_level=1, predictor=3,
+                       tiled=True, blockxsize=512, blockysize=512,
+                       num_threads='all_cpus') as dst:
+        for row_start in range(0, height, band_rows):
+            rows = min(band_rows, height - row_start)
+            band = np.multiply(total[row_start:row_start + rows], factor,
+                               out=band_buffer[:rows], casting='same_kind')
+            positive_total += float(np.sum(band, where=band > 0, dtype=np.float64))
+            dst.write(band, 1, window=Window(0, row_start, width, rows))
+
+    return positive_total
+
+def zarr_format_kwargs():
+    """
+    Keyword arguments that make zarr 3 write Zarr format 2, as zarr 2 does
+
+    The stores use numcodecs compressors, which only format 2 accepts, so
+    the same stores are written (and read back) with either zarr version.
+    """
+
+    import zarr
+
+    if int(zarr.__version__.split('.')[0]) >= 3:
+        return {'zarr_format': 2}
+    return {}
+
+def create_zstd_array(store_path, shape, chunks, dtype, fill_value, path=None):
+    """
+    Create (or overwrite) a Blosc zstd-compressed Zarr array at store_path
+    (under path within it, if given), with zarr 2 or 3
+    """
+
+    import zarr
+    from numcodecs import Blosc
+
+    kwargs = zarr_format_kwargs()
+    if path is not None:
+        kwargs['path'] = path
+    return zarr.create(shape=shape, chunks=chunks, dtype=dtype, fill_value=fill_value,
+                       compressor=Blosc(cname='zstd', clevel=1, shuffle=Blosc.BITSHUFFLE),
+                       store=store_path, overwrite=True, **kwargs)
+
+def create_flux_store(store_path, num_days, shape, transform, crs_wkt):
+    """
+    Create (or overwrite) a Zarr store holding one daily flux raster per index
+
+    Args:
+        store_path: Path of the Zarr directory store
+        num_days: Number of days (first dimension)
+        shape: (height, width) of the processing grid
+        transform: Affine transform of the grid
+        crs_wkt: WKT of the grid CRS
+
+    Returns:
+        str: store_path
+    """
+
+    # One chunk per day and 512x512 tile, so concurrent workers writing
+    # different days never touch the same chunk
+    store = create_zstd_array(store_path, shape=(num_days, shape[0], shape[1]),
+                              chunks=(1, 512, 512), dtype='float32', fill_value=0.0)
+    store.attrs['transform'] = list(transform.to_gdal())
+    store.attrs['crs_wkt'] = crs_wkt
+
+    return store_path
+
+def sum_flux_store(store_path):
+    """
+    Sum all days of a Zarr flux store created by create_flux_store
+
+    Returns:
+        tuple: (float64 sum array, reference transform, reference crs)
+    """
+
+    import zarr
+    from rasterio.crs import CRS
+    from rasterio.transform import Affine
+
+    store = zarr.open(store_path, mode='r')
+    num_days, height, width = store.shape
+    block_rows, block_cols = store.chunks[1:]
+
+    def sum_tile(tile):
+        row_start, col_start = tile
+        rows = slice(row_start, min(row_start + block_rows, height))
+        cols = slice(col_start, min(col_start + block_cols, width))
+        return rows, cols, store[:, rows, cols].sum(axis=0, dtype=np.float64)
+
+    # Reduce one chunk-sized tile at a time across all days, so memory stays
+    # bounded by (days x tile) per reader thread rather than the whole cube.
+    # Blosc decompression releases the GIL, so tiles are read concurrently.
+    tiles = [(row_start, col_start)
+             for row_start in range(0, height, block_rows)
+             for col_start in range(0, width, block_cols)]
+    total = np.empty((height, width), dtype=np.float64)
+    with ThreadPoolExecutor(max_workers=READ_THREADS) as executor:
+        for rows, cols, tile_sum in executor.map(sum_tile, tiles):
+            total[rows, cols] = tile_sum
+
+    reference_transform = Affine.from_gdal(*store.attrs['transform'])
+    reference_crs = CRS.from_wkt(store.attrs['crs_wkt'])
+
+    return total, reference_transform, reference_crs
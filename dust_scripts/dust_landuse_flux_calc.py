@@ -1,28 +1,47 @@
-def run(inputdir):
-    """
-    Calculate dust fluxes using pre-processed meteorology + current land use (LAND USE DEPENDENT)
-    Much faster since meteorology is already processed
-    """
-    import pygeoprocessing.geoprocessing as geop
-    from osgeo import gdal
-    import math
+def _cached(cache, key, stamp_path, load):
+    """load(), from cache when it was filled since stamp_path last changed"""
     import os
-    import numpy as np
-    from datetime import datetime, timedelta
     
-    print("Calculating dust fluxes with current land use...")
+    if cache is None:
+        return load()
     
-    wdir = "./"
+    stat = os.stat(stamp_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    entry = cache.get(key)
+    if entry is None or entry[0] != stamp:
+        array = load()
+        array.flags.writeable = False  # shared by later scenarios
+        entry = cache[key] = (stamp, array)
+    return entry[1]
+
+def _read_band(cache, path):
+    """Band 1 of a raster, from cache when it holds the current file"""
+    import rasterio
     
-    # Get reference grid info
-    soc_raster_out = os.path.join(wdir,'grid.tif')
-    grid_info = geop.get_raster_info(soc_raster_out)
+    def load():
+        with rasterio.open(path) as src:
+            return src.read(1)
+    return _cached(cache, path, path, load)
+
+def _creation_tuples():
+    """
+    (float, int) raster driver creation tuples for pygeoprocessing
     
-    # Full year 2021
-    start_date = datetime(2021, 1, 1)
-    end_date = datetime(2021, 12, 31)
+    ZSTD-compressed 512x512 tiles, encoded on all cores. The floating-point
+    predictor (3) is only valid for float rasters; soil texture uses 2.
+    """
+    zstd_creation_options = (
+        'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=ZSTD', 'ZSTD_LEVEL=1',
+        'BLOCKXSIZE=512', 'BLOCKYSIZE=512', 'NUM_THREADS=ALL_CPUS')
+    return (('GTIFF', zstd_creation_options + ('PREDICTOR=3',)),
+            ('GTIFF', zstd_creation_options + ('PREDICTOR=2',)))
+
+def _load_soil_texture(grid_info, cache):
+    """Aligned soil texture array (aligning it to the grid first if needed)"""
+    import os
+    import pygeoprocessing.geoprocessing as geop
+    from dust_scripts.dust_flux_kernels import check_soil_texture
     
-    # Load pre-aligned soil texture
     aligned_soil_texture = "intermediate/aligned_soil_texture.tif"
     if not os.path.exists(aligned_soil_texture):
         soil_texture_path = "intermediate/soil_texture.tif"
@@ -30,37 +49,31 @@ def run(inputdir):
             [soil_texture_path],
             [aligned_soil_texture],
             ['bilinear'],
-            geop.get_raster_info(soc_raster_out)['pixel_size'],
-            bounding_box_mode=geop.get_raster_info(soc_raster_out)['bounding_box'],
-            target_projection_wkt=geop.get_raster_info(soc_raster_out)['projection_wkt'])
-    
-    # Emission flux equations (units: g cm-2 s-1)
-    def flux(ustar, soiltype):
-        if soiltype == 0: #MS
-            return 1.243*(10.0 **(-7)) * ustar ** 2.64
-        elif soiltype == 1: #NA
-            return 0.0
-        elif soiltype == 2: #FSS
-            return 2.45*(10.0 ** (-6)) * ustar ** 3.97
-        elif soiltype == 3: #FS
-            return 9.33*(10.0 ** (-7)) * ustar ** 2.44
-        elif soiltype == 4: #CS
-            return 1.243*(10.0 ** (-7)) * ustar ** 3.44
-        elif soiltype == -1:
-            return 0.0
-        else:
-            raise ValueError("soil type not recognized")
-    
-    flux_v = np.vectorize(flux)
+            grid_info['pixel_size'],
+            bounding_box_mode=grid_info['bounding_box'],
+            target_projection_wkt=grid_info['projection_wkt'],
+            raster_driver_creation_tuple=_creation_tuples()[1])
     
-    def multiply_raster(x,y):
-        return x * y
+    soil_texture = _read_band(cache, aligned_soil_texture)
+    check_soil_texture(soil_texture)
+    return soil_texture
+
+def aligned_z0_effect(inputdir, grid_info):
+    """
+    Calculate the land use z0 effect from inputs/gblulcg20_10000.tif and
+    align it with the grid (LAND USE DEPENDENT)
     
-    multiply_raster_v = np.vectorize(multiply_raster)
+    Returns:
+        str: Path of the aligned z0 effect raster (intermediate/aligned_z0.tif)
+    """
+    import pygeoprocessing.geoprocessing as geop
+    from osgeo import gdal
+    import math
+    import os
+    import numpy as np
     
-    ############################################################
-    # Calculate land use effects (LAND USE DEPENDENT)
-    ############################################################
+    wdir = "./"
+    zstd_float_creation_tuple = _creation_tuples()[0]
     
     lu_raster = [(os.path.join(inputdir,'inputs', 'gblulcg20_10000.tif'),1)]
     lu_raster_out = os.path.join(wdir,'intermediate','z0_effect_dust.tif')
@@ -68,42 +81,37 @@ def run(inputdir):
     # Land use to surface roughness mapping
     # Updated to handle Simple 4-class classification system used by UK scenarios:
     # 0 = Other (water, urban, bare), 1 = Cropland, 2 = Grass, 3 = Forest
-    def z0(lu):
-        k = 100.0
-        fdtf = 0.0
-        match lu:
-            case 0: # Other (water, urban, bare) - Conservative: no dust emissions
-                # Since Simple "Other" includes water and urban (no dust) but also 
-                # bare areas (high dust), we conservatively assign no dust to avoid
-                # overestimation over water/urban areas
-                k = 100.0
-                fdtf = 0.0
-            case 1: # Cropland - moderate dust emissions
-                k = 0.0310
-                fdtf = 0.75
-            case 2: # Grass - moderate dust emissions  
-                k = 0.1000
-                fdtf = 0.75
-            case 3: # Forest - no dust emissions
-                k = 50.0
-                fdtf = 0.0
-            case _: # Any unexpected values - no dust (conservative)
-                k = 100.0
-                fdtf = 0.0
-        
-        # Convert to surface roughness effect
-        result = fdtf / (2.5 * math.log(1000.0/k))
-        return result
+    z0_parameters = {  # lu: (k, fdtf)
+        # Other (water, urban, bare) - Conservative: no dust emissions
+        # Since Simple "Other" includes water and urban (no dust) but also
+        # bare areas (high dust), we conservatively assign no dust to avoid
+        # overestimation over water/urban areas
+        0: (100.0, 0.0),
+        1: (0.0310, 0.75),  # Cropland - moderate dust emissions
+        2: (0.1000, 0.75),  # Grass - moderate dust emissions
+        3: (50.0, 0.0),     # Forest - no dust emissions
+    }
+    
+    # Convert to surface roughness effect once per class; any unexpected
+    # values get no dust (conservative). Each pixel is then a single gather.
+    z0_lut = np.zeros(256, dtype=np.float32)
+    for lu, (k, fdtf) in z0_parameters.items():
+        z0_lut[lu] = fdtf / (2.5 * math.log(1000.0/k))
     
-    z0_v = np.vectorize(z0)
+    def z0_v(lu):
+        if lu.dtype == np.uint8:
+            return z0_lut[lu]
+        in_table = (lu >= 0) & (lu < z0_lut.size)
+        return np.where(in_table, z0_lut[np.where(in_table, lu, 0).astype(np.intp)], 0.0)
     
     # Calculate z0 effect from current land use
     geop.raster_calculator(base_raster_path_band_const_list=lu_raster,
-                          local_op=z0_v, 
+                          local_op=z0_v,
                           target_raster_path=lu_raster_out,
                           datatype_target=gdal.GDT_Float32,
                           nodata_target=-1,
-                          calc_raster_stats=False)
+                          calc_raster_stats=False,
+                          raster_driver_creation_tuple=zstd_float_creation_tuple)
     
     # Align z0 with grid
     aligned_z0_path = os.path.join(wdir, 'intermediate', 'aligned_z0.tif')
@@ -111,13 +119,43 @@ def run(inputdir):
         [lu_raster_out],
         [aligned_z0_path],
         ['bilinear'],
-        geop.get_raster_info(soc_raster_out)['pixel_size'],
-        bounding_box_mode=geop.get_raster_info(soc_raster_out)['bounding_box'],
-        target_projection_wkt=geop.get_raster_info(soc_raster_out)['projection_wkt'])
+        grid_info['pixel_size'],
+        bounding_box_mode=grid_info['bounding_box'],
+        target_projection_wkt=grid_info['projection_wkt'],
+        raster_driver_creation_tuple=zstd_float_creation_tuple)
     
-    ############################################################
-    # Process each day using pre-processed meteorology
-    ############################################################
+    return aligned_z0_path
+
+def _zarr_day_reader(array, day):
+    """read(window=None) over one day of a (day, y, x) Zarr array"""
+    def read(window=None):
+        return array[day] if window is None else array[(day,) + window.toslices()]
+    return read
+
+def _daily_meteorology(meteorology_store):
+    """
+    Yield (date_str, read_wind_speed, read_sm_mask) for each day of 2021 with
+    pre-processed meteorology, from the daily GeoTIFFs or the Zarr store
+    
+    Each reader takes an optional rasterio Window and returns that part of
+    the day's raster (all of it by default). Only the requested windows are
+    read; the daily GeoTIFFs stay open while the day is processed. Days are
+    always streamed, never cached: a year of meteorology on a fine grid does
+    not fit in memory.
+    """
+    import os
+    import rasterio
+    from datetime import datetime, timedelta
+    
+    # Full year 2021
+    start_date = datetime(2021, 1, 1)
+    end_date = datetime(2021, 12, 31)
+    
+    if meteorology_store is not None:
+        import zarr
+        store = zarr.open_group(meteorology_store, mode='r')
+        store_start = datetime.strptime(store.attrs['start_date'], '%Y%m%d')
+        has_soil_moisture = store['has_soil_moisture'][:]
     
     print(f"Processing {(end_date - start_date).days + 1} days of dust fluxes...")
     
@@ -125,41 +163,149 @@ def run(inputdir):
         date_str = date.strftime('%Y%m%d')
         
         # Load pre-processed meteorology
-        aligned_ws_path = f'intermediate/daily_meteorology/ws_aligned_{date_str}.tif'
-        sm_raster_aligned = f'intermediate/daily_meteorology/sm_aligned_{date_str}.tif'
-        
-        if not os.path.exists(aligned_ws_path) or not os.path.exists(sm_raster_aligned):
-            print(f"Warning: Missing meteorology for {date_str}, skipping...")
-            continue
-        
-        # Calculate ustar (friction velocity)
-        ustar_path = f'intermediate/ustar_{date_str}.tif'
-        listraster_uri = [(aligned_ws_path,1),(aligned_z0_path,1)]
-        geop.raster_calculator(base_raster_path_band_const_list=listraster_uri,
-                              local_op=multiply_raster_v, 
-                              target_raster_path=ustar_path,
-                              datatype_target=gdal.GDT_Float32,
-                              nodata_target=-1,
-                              calc_raster_stats=False)
-        
-        # Calculate flux
-        flux_path = f'intermediate/flux_{date_str}.tif'
-        listraster_ura = [(ustar_path,1),(aligned_soil_texture,1)]
-        geop.raster_calculator(base_raster_path_band_const_list=listraster_ura,
-                              local_op=flux_v, 
-                              target_raster_path=flux_path,
-                              datatype_target=gdal.GDT_Float32,
-                              nodata_target=-1,
-                              calc_raster_stats=False)
-        
-        # Apply soil moisture mask
+        if meteorology_store is not None:
+            day = (date - store_start).days
+            if not 0 <= day < has_soil_moisture.size or not has_soil_moisture[day]:
+                print(f"Warning: Missing meteorology for {date_str}, skipping...")
+                continue
+            
+            yield (date_str, _zarr_day_reader(store['wind_speed'], day),
+                   _zarr_day_reader(store['dry_mask'], day))
+        else:
+            aligned_ws_path = f'intermediate/daily_meteorology/ws_aligned_{date_str}.tif'
+            sm_raster_aligned = f'intermediate/daily_meteorology/sm_aligned_{date_str}.tif'
+            
+            if not os.path.exists(aligned_ws_path) or not os.path.exists(sm_raster_aligned):
+                print(f"Warning: Missing meteorology for {date_str}, skipping...")
+                continue
+            
+            with rasterio.open(aligned_ws_path) as ws_src, rasterio.open(sm_raster_aligned) as sm_src:
+                yield (date_str, lambda window=None: ws_src.read(1, window=window),
+                       lambda window=None: sm_src.read(1, window=window))
+
+def run(inputdir, cache=None, meteorology_store=None):
+    """
+    Calculate dust fluxes using pre-processed meteorology + current land use (LAND USE DEPENDENT)
+    Much faster since meteorology is already processed
+    
+    cache is an optional dict kept by a caller that runs several land use
+    scenarios on the same grid. The soil texture does not depend on land use,
+    so its array is kept in it (keyed by path, and re-read if the file
+    changes) and later scenarios skip that read. Daily meteorology is always
+    streamed (a year of it does not fit in memory on a fine grid).
+    
+    meteorology_store is an optional Zarr store written by
+    dust_meteorology_preprocessing.run(..., store_path=...); days are then
+    read from it rather than from the daily GeoTIFFs, one chunk per block.
+    """
+    import pygeoprocessing.geoprocessing as geop
+    import os
+    import numpy as np
+    import rasterio
+    from rasterio.windows import Window
+    from dust_scripts.dust_flux_kernels import dust_flux_masked
+    
+    print("Calculating dust fluxes with current land use...")
+    
+    wdir = "./"
+    
+    # Get reference grid info
+    soc_raster_out = os.path.join(wdir,'grid.tif')
+    grid_info = geop.get_raster_info(soc_raster_out)
+    
+    soil_texture = _load_soil_texture(grid_info, cache)
+    aligned_z0_path = aligned_z0_effect(inputdir, grid_info)
+    
+    ############################################################
+    # Process each day using pre-processed meteorology
+    ############################################################
+    
+    # Static inputs are read once; each day then computes ustar, flux and the
+    # soil moisture mask in memory and writes only the masked flux (no ustar_
+    # or unmasked flux_ GeoTIFFs). Emission flux equations (units: g cm-2 s-1)
+    # live in dust_flux_kernels.
+    #
+    # Each day is computed and written one 512x512 output block at a time,
+    # so only a block of meteorology and flux is held at once and the
+    # kernel's inputs stay in cache. The static z0 effect and soil texture
+    # are split into contiguous kernel-ready blocks once, and every block's
+    # flux goes into one reused buffer, so the day loop neither copies nor
+    # allocates them.
+    with rasterio.open(aligned_z0_path) as src:
+        z0_effect = src.read(1)
+        flux_profile = src.profile
+    
+    flux_profile.update(dtype='float32', nodata=-1, count=1,
+                        compress='zstd', zstd_level=1, predictor=3, tiled=True,
+                        blockxsize=512, blockysize=512, num_threads='all_cpus')
+    
+    # The same windows as the output's tiles (dst.block_windows)
+    block_x, block_y = flux_profile['blockxsize'], flux_profile['blockysize']
+    height, width = z0_effect.shape
+    blocks = []
+    for row_start in range(0, height, block_y):
+        for col_start in range(0, width, block_x):
+            window = Window(col_start, row_start,
+                            min(block_x, width - col_start), min(block_y, height - row_start))
+            rows, cols = window.toslices()
+            blocks.append((window,
+                           np.ascontiguousarray(z0_effect[rows, cols], dtype=np.float32),
+                           np.ascontiguousarray(soil_texture[rows, cols], dtype=np.int32)))
+    # The blocks hold copies, so drop the full arrays rather than keep both
+    # (a cached soil texture stays in the cache)
+    del z0_effect, soil_texture
+    flux_buffer = np.empty(block_x * block_y, dtype=np.float32)
+    
+    for date_str, read_wind_speed, read_sm_mask in _daily_meteorology(meteorology_store):
         flux_masked_path = f'intermediate/flux_masked_{date_str}.tif'
-        listraster_urp = [(sm_raster_aligned,1),(flux_path,1)]
-        geop.raster_calculator(base_raster_path_band_const_list=listraster_urp,
-                              local_op=multiply_raster_v, 
-                              target_raster_path=flux_masked_path,
-                              datatype_target=gdal.GDT_Float32,
-                              nodata_target=-1,
-                              calc_raster_stats=False)
-    
-    print("✅ Land use flux calculation completed")
\ No newline at end of file
+        with rasterio.open(flux_masked_path, 'w', **flux_profile) as dst:
+            for window, z0_block, soil_block in blocks:
+                out = flux_buffer[:z0_block.size].reshape(z0_block.shape)
+                
+                # ustar = ws * z0, flux by soil texture, then the soil moisture mask
+                flux_masked = dust_flux_masked(read_wind_speed(window), z0_block, soil_block,
+                                               read_sm_mask(window), out=out)
+                dst.write(flux_masked, 1, window=window)
+    
+    print("✅ Land use flux calculation completed")
+
+def sum_scenario_fluxes(z0_effects, cache=None, meteorology_store=None):
+    """
+    Sum a year of daily dust flux for several land use scenarios in one pass
+    
+    Each day's meteorology is read once and the flux of every scenario is
+    added straight into its float64 total, so no daily flux rasters are
+    written and nothing is read back to sum them. All scenarios must be on
+    the current grid (grid.tif), which the meteorology is aligned to.
+    
+    Args:
+        z0_effects: Dict of scenario name -> aligned z0 effect array
+            (see aligned_z0_effect)
+        cache, meteorology_store: As for run()
+    
+    Returns:
+        dict: Scenario name -> float64 sum of daily flux (g cm-2 s-1), the
+        same total dust_3_sum computes from the daily flux rasters
+    """
+    import pygeoprocessing.geoprocessing as geop
+    import os
+    import numpy as np
+    from dust_scripts.dust_flux_kernels import dust_flux_masked
+    
+    grid_info = geop.get_raster_info('grid.tif')
+    soil_texture = _load_soil_texture(grid_info, cache)
+    
+    width, height = grid_info['raster_size']
+    for name, z0_effect in z0_effects.items():
+        if z0_effect.shape != (height, width):
+            raise ValueError(f"z0 effect for {name} is {z0_effect.shape}, grid is {(height, width)}")
+    
+    totals = {name: np.zeros((height, width), dtype=np.float64) for name in z0_effects}
+    
+    for date_str, read_wind_speed, read_sm_mask in _daily_meteorology(meteorology_store):
+        wind_speed = read_wind_speed()
+        sm_mask = read_sm_mask()
+        for name, z0_effect in z0_effects.items():
+            totals[name] += dust_flux_masked(wind_speed, z0_effect, soil_texture, sm_mask)
+    
+    return totals
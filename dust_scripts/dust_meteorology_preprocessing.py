@@ -1,16 +1,257 @@
-def run(inputdir):
+import functools
+import os
+
+# Creation options for the aligned daily rasters: ZSTD tiles, float predictor
+# for wind speed, 1-bit packing for the dry mask (libtiff has no predictor for
+# 1-bit samples)
+_ALIGNED_CREATION_OPTIONS = [
+    'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=ZSTD', 'ZSTD_LEVEL=1',
+    'BLOCKXSIZE=512', 'BLOCKYSIZE=512', 'NUM_THREADS=ALL_CPUS']
+WS_ALIGNED_CREATION_OPTIONS = _ALIGNED_CREATION_OPTIONS + ['PREDICTOR=3']
+SM_ALIGNED_CREATION_OPTIONS = _ALIGNED_CREATION_OPTIONS + ['NBITS=1']
+
+def _mem_raster(array, geotransform, gdal_type):
+    """Wrap a lat/lon array in an in-memory GDAL dataset (MEM driver)"""
+    from osgeo import gdal, osr
+    
+    rows, cols = array.shape
+    dataset = gdal.GetDriverByName('MEM').Create('', cols, rows, 1, gdal_type)
+    dataset.SetGeoTransform(geotransform)
+    srs = osr.SpatialReference()
+    srs.ImportFromProj4('+proj=latlong')
+    dataset.SetProjection(srs.ExportToWkt())
+    dataset.GetRasterBand(1).WriteArray(array)
+    return dataset
+
+def _warp_to_grid(source, target_path, grid_info, creation_options, driver='GTiff'):
     """
-    Preprocess meteorological data for dust emissions (LAND USE INDEPENDENT)
-    Run once for full year 2021, reuse for all scenarios
+    Bilinearly warp a raster (path or GDAL dataset) onto the reference grid
+    with a single gdal.Warp
+
+    Same result as align_and_resize_raster_stack with the grid's pixel size,
+    bounding box and projection, without its per-call raster info lookups
+    and bounding box bookkeeping. With driver='MEM' (and an empty target
+    path) the warped dataset stays in memory and is returned. Otherwise an
+    existing target_path is replaced (gdal.Warp would warp into it), the
+    file is flushed and closed, and target_path is returned.
+    
+    Raises:
+        RuntimeError: If gdal.Warp fails
     """
-    import pygeoprocessing.geoprocessing as geop
     from osgeo import gdal
+    
+    if driver != 'MEM' and os.path.exists(target_path):
+        os.remove(target_path)
+    
+    min_x, min_y, max_x, max_y = grid_info['bounding_box']
+    dataset = gdal.Warp(target_path, source,
+                        format=driver,
+                        outputBounds=(min_x, min_y, max_x, max_y),
+                        xRes=abs(grid_info['pixel_size'][0]),
+                        yRes=abs(grid_info['pixel_size'][1]),
+                        dstSRS=grid_info['projection_wkt'],
+                        resampleAlg='bilinear',
+                        creationOptions=creation_options)
+    if dataset is None:
+        raise RuntimeError(f"gdal.Warp failed for {target_path or 'in-memory raster'}: "
+                           f"{gdal.GetLastErrorMsg()}")
+    
+    if driver == 'MEM':
+        return dataset
+    dataset = None  # Flush and close the file
+    return target_path
+
+def create_meteorology_store(store_path, start_date, num_days, grid_info):
+    """
+    Create (or overwrite) a Zarr store for the aligned daily meteorology
+    
+    Holds wind_speed (float32) and dry_mask (uint8) as (day, y, x) arrays and
+    has_soil_moisture (one flag per day), so the flux step opens one store
+    instead of two GeoTIFFs per day. The store is marked complete by
+    run() once every day is written (see meteorology_store_complete).
+    
+    Returns:
+        str: store_path
+    """
+    import zarr
+    from dust_scripts.dust_flux_sum import create_zstd_array, zarr_format_kwargs
+    
+    width, height = grid_info['raster_size']
+    
+    # One chunk per day and 512x512 tile (one per day for the flags), so
+    # worker processes writing different days never touch the same chunk.
+    # Written as Zarr format 2 under zarr 2 or 3 (see create_zstd_array)
+    root = zarr.open_group(store_path, mode='w', **zarr_format_kwargs())
+    create_zstd_array(store_path, shape=(num_days, height, width), chunks=(1, 512, 512),
+                      dtype='float32', fill_value=0.0, path='wind_speed')
+    create_zstd_array(store_path, shape=(num_days, height, width), chunks=(1, 512, 512),
+                      dtype='uint8', fill_value=0, path='dry_mask')
+    zarr.create(shape=(num_days,), chunks=(1,), dtype='uint8', fill_value=0,
+                store=store_path, path='has_soil_moisture', overwrite=True,
+                **zarr_format_kwargs())
+    root.attrs.update({
+        'start_date': start_date.strftime('%Y%m%d'),
+        'geotransform': list(grid_info['geotransform']),
+        'crs_wkt': grid_info['projection_wkt'],
+        'complete': False,
+    })
+    
+    return store_path
+
+@functools.lru_cache(maxsize=8)
+def _count_entries(directory, mtime_ns, limit):
+    """
+    Count directory entries with os.scandir, stopping at limit
+
+    Memoized on the directory's mtime, which changes whenever files are added
+    or removed, so repeated checks in a batch do not rescan it.
+    """
+    count = 0
+    with os.scandir(directory) as entries:
+        for _ in entries:
+            count += 1
+            if count >= limit:
+                break
+    return count
+
+def meteorology_files_ready(meteorology_dir="intermediate/daily_meteorology", min_files=700):
+    """True if meteorology_dir holds at least min_files aligned daily rasters (~365 days x 2)"""
+    try:
+        mtime_ns = os.stat(meteorology_dir).st_mtime_ns
+    except FileNotFoundError:
+        return False
+    return _count_entries(meteorology_dir, mtime_ns, min_files) >= min_files
+
+def meteorology_store_complete(store_path):
+    """True if store_path holds a meteorology store that run() finished writing"""
+    if not os.path.exists(store_path):
+        return False
+    
+    import zarr
+    return bool(zarr.open_group(store_path, mode='r').attrs.get('complete', False))
+
+def _process_day(date_str, inputdir, grid_info, sm_path, store_path=None, day_index=None):
+    """
+    Process one day's wind speed and soil moisture and align them with the grid
+
+    Runs in a worker process, so it takes only picklable arguments and opens
+    its own netCDF/GDAL handles. The aligned rasters are written as daily
+    GeoTIFFs, or into day day_index of the Zarr store at store_path.
+    sm_path is the SMOPS file to use for the day (the newest one on or
+    before date_str, see _soil_moisture_paths), or None if there is none.
+    """
     import os
     import numpy as np
+    from osgeo import gdal
     from netCDF4 import Dataset
-    import rasterio
-    from rasterio.transform import from_origin
+    
+    print(f"Processing meteorology for {date_str}")
+    
+    # Process wind speed data
+    merra_path = os.path.join(inputdir, "inputs", "MERRA2", f"MERRA2_400.tavg1_2d_slv_Nx.{date_str}.nc4")
+    merra_path_2 = os.path.join(inputdir, "inputs", "MERRA2", f"MERRA2_401.tavg1_2d_slv_Nx.{date_str}.nc4")
+    
+    if not os.path.isfile(merra_path):
+        merra_path = merra_path_2
+    
+    # Plain float32 arrays (MERRA2 winds have no missing values) instead of
+    # float64 masked arrays
+    with Dataset(merra_path, 'r') as ncfile:
+        east_wind = np.ma.filled(ncfile.variables['U10M'][:], 0).astype(np.float32, copy=False)
+        north_wind = np.ma.filled(ncfile.variables['V10M'][:], 0).astype(np.float32, copy=False)
+    
+    # Hourly speed sqrt(u^2 + v^2) computed in place in one buffer
+    wind_speed = np.multiply(east_wind, east_wind)
+    np.multiply(north_wind, north_wind, out=north_wind)
+    wind_speed += north_wind
+    np.sqrt(wind_speed, out=wind_speed)
+    wind_speed = wind_speed.mean(axis=0, dtype=np.float32)  # Average over day
+    wind_speed = np.flip(wind_speed, axis=0)  # Flip latitudes
+    
+    # Wind speed raster (-180, 90 origin, 0.625 x 0.5 degrees) kept in memory;
+    # it only exists to be warped onto the grid, so it never touches disk
+    ws_raster = _mem_raster(wind_speed, (-180, 0.625, 0, 90, 0, -0.5), gdal.GDT_Float32)
+    
+    # Align wind speed with grid
+    if store_path is None:
+        aligned_ws_path = f'intermediate/daily_meteorology/ws_aligned_{date_str}.tif'
+        _warp_to_grid(ws_raster, aligned_ws_path, grid_info, WS_ALIGNED_CREATION_OPTIONS)
+    else:
+        import zarr
+        store = zarr.open_group(store_path, mode='r+')
+        aligned_ws = _warp_to_grid(ws_raster, '', grid_info, None, driver='MEM')
+        store['wind_speed'][day_index] = aligned_ws.ReadAsArray()
+        aligned_ws = None
+    ws_raster = None
+    
+    # Process soil moisture data
+    if sm_path is None:
+        # No SMOPS file on or before this day; the flux step skips days
+        # without sm_aligned
+        print(f"Warning: Missing soil moisture for {date_str}, skipping sm")
+        return date_str
+    if not sm_path.endswith(f"D{date_str}.nc"):
+        print(f"Warning: Missing soil moisture for {date_str}, using {os.path.basename(sm_path)}")
+    
+    with Dataset(sm_path, 'r') as ncfile:
+        sm_data = ncfile.variables['Blended_SM'][:]
+    
+    # Check for dry conditions
+    dry_mask = sm_data < 0.1
+    
+    # Soil moisture raster (0.25 degrees), in memory as for wind speed. The
+    # raw comparison result is kept for masked (missing) pixels, as before.
+    sm_raster = _mem_raster(np.ma.getdata(dry_mask).astype(np.uint8),
+                            (-180, 0.25, 0, 90, 0, -0.25), gdal.GDT_Byte)
+    
+    # Align soil moisture with grid
+    if store_path is None:
+        sm_raster_aligned = f'intermediate/daily_meteorology/sm_aligned_{date_str}.tif'
+        _warp_to_grid(sm_raster, sm_raster_aligned, grid_info, SM_ALIGNED_CREATION_OPTIONS)
+    else:
+        aligned_sm = _warp_to_grid(sm_raster, '', grid_info, None, driver='MEM')
+        store['dry_mask'][day_index] = aligned_sm.ReadAsArray()
+        store['has_soil_moisture'][day_index] = 1
+        aligned_sm = None
+    sm_raster = None
+    
+    return date_str
+
+def _soil_moisture_paths(inputdir, date_strs):
+    """
+    Map each date to the SMOPS file used for it
+
+    A missing day reuses the newest earlier SMOPS file, as the sequential
+    loop did by keeping the previous day's soil moisture. Dates with no
+    file on or before them map to None.
+    """
+    sm_paths = {}
+    last_path = None
+    for date_str in date_strs:
+        sm_path = os.path.join(inputdir, "inputs", "SMOPS", f"NPR_SMOPS_CMAP_D{date_str}.nc")
+        if os.path.isfile(sm_path):
+            last_path = sm_path
+        sm_paths[date_str] = last_path
+    return sm_paths
+
+def run(inputdir, num_processes=None, store_path=None):
+    """
+    Preprocess meteorological data for dust emissions (LAND USE INDEPENDENT)
+    Run once for full year 2021, reuse for all scenarios
+    
+    Args:
+        inputdir: Input directory path
+        num_processes: Number of worker processes (default: CPU count, capped at 8)
+        store_path: Optional Zarr store path. When given, the aligned days go
+            into one store (see create_meteorology_store) instead of
+            ws_aligned_*/sm_aligned_* GeoTIFFs; pass it to
+            dust_landuse_flux_calc.run(inputdir, meteorology_store=...)
+    """
+    import pygeoprocessing.geoprocessing as geop
+    import os
+    from concurrent.futures import ProcessPoolExecutor
     from datetime import datetime, timedelta
+    from itertools import repeat
     
     print("Processing meteorology for full year 2021 (land-use independent)...")
     
@@ -19,7 +260,6 @@ def run(inputdir):
     # Get reference grid info for dynamic sizing
     soc_raster_out = os.path.join(wdir,'grid.tif')
     grid_info = geop.get_raster_info(soc_raster_out)
-    grid_height, grid_width = grid_info['raster_size'][1], grid_info['raster_size'][0]
     
     # Define FULL YEAR 2021
     start_date = datetime(2021, 1, 1)
@@ -28,81 +268,32 @@ def run(inputdir):
     print(f"Date range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
     print(f"Total days: {(end_date - start_date).days + 1}")
     
-    # Create output directory for daily meteorology
-    os.makedirs("intermediate/daily_meteorology", exist_ok=True)
-    
-    # Process each day's meteorology
-    for date in [start_date + timedelta(days=x) for x in range((end_date - start_date).days + 1)]:
-        date_str = date.strftime('%Y%m%d')
-        print(f"Processing meteorology for {date_str}")
-        
-        # Process wind speed data
-        merra_path = os.path.join(inputdir, "inputs", "MERRA2", f"MERRA2_400.tavg1_2d_slv_Nx.{date_str}.nc4")
-        merra_path_2 = os.path.join(inputdir, "inputs", "MERRA2", f"MERRA2_401.tavg1_2d_slv_Nx.{date_str}.nc4")
-        
-        if os.path.isfile(merra_path):
-            with Dataset(merra_path, 'r') as ncfile:
-                east_wind = ncfile.variables['U10M'][:]
-                north_wind = ncfile.variables['V10M'][:]
-        else:
-            with Dataset(merra_path_2, 'r') as ncfile:
-                east_wind = ncfile.variables['U10M'][:]
-                north_wind = ncfile.variables['V10M'][:]
-        
-        wind_speed = np.sqrt(np.square(east_wind) + np.square(north_wind))
-        wind_speed = wind_speed.mean(axis=0)  # Average over day
-        wind_speed = np.flip(wind_speed, axis=0)  # Flip latitudes
-        
-        # Save wind speed raster
-        ws_raster_out = f'intermediate/daily_meteorology/ws_{date_str}.tif'
-        rows, cols = wind_speed.shape
-        transform = from_origin(-180, 90, 0.625, 0.5)
-        
-        with rasterio.open(ws_raster_out, 'w', driver='GTiff', height=rows, width=cols, 
-                          count=1, dtype='float32', crs='+proj=latlong', transform=transform) as dst:
-            dst.write(wind_speed, 1)
-        
-        # Align wind speed with grid
-        aligned_ws_path = f'intermediate/daily_meteorology/ws_aligned_{date_str}.tif'
-        geop.align_and_resize_raster_stack(
-            [ws_raster_out],
-            [aligned_ws_path],
-            ['bilinear'],
-            geop.get_raster_info(soc_raster_out)['pixel_size'],
-            bounding_box_mode=geop.get_raster_info(soc_raster_out)['bounding_box'],
-            target_projection_wkt=geop.get_raster_info(soc_raster_out)['projection_wkt'])
-        
-        # Process soil moisture data
-        sm_path = os.path.join(inputdir, "inputs", "SMOPS", f"NPR_SMOPS_CMAP_D{date_str}.nc")
-        if os.path.isfile(sm_path):
-            with Dataset(sm_path, 'r') as ncfile:
-                sm_data = ncfile.variables['Blended_SM'][:]
-        
-        # Check for dry conditions
-        dry_mask = sm_data < 0.1
-        
-        # Save soil moisture raster
-        sm_raster_out = f'intermediate/daily_meteorology/sm_{date_str}.tif'
-        rows, cols = dry_mask.shape
-        transform = from_origin(-180, 90, 0.25, 0.25)
-        
-        with rasterio.open(sm_raster_out, 'w', driver='GTiff', height=rows, width=cols, 
-                          count=1, dtype='uint8', crs='+proj=latlong', transform=transform) as dst:
-            dst.write(dry_mask, 1)
-        
-        # Align soil moisture with grid
-        sm_raster_aligned = f'intermediate/daily_meteorology/sm_aligned_{date_str}.tif'
-        geop.align_and_resize_raster_stack(
-            [sm_raster_out],
-            [sm_raster_aligned],
-            ['bilinear'],
-            geop.get_raster_info(soc_raster_out)['pixel_size'],
-            bounding_box_mode=geop.get_raster_info(soc_raster_out)['bounding_box'],
-            target_projection_wkt=geop.get_raster_info(soc_raster_out)['projection_wkt'])
-        
-        # Clean up temporary files to save space
-        os.remove(ws_raster_out)
-        os.remove(sm_raster_out)
+    date_strs = [(start_date + timedelta(days=x)).strftime('%Y%m%d')
+                 for x in range((end_date - start_date).days + 1)]
+    
+    if store_path is None:
+        # Create output directory for daily meteorology
+        os.makedirs("intermediate/daily_meteorology", exist_ok=True)
+    else:
+        create_meteorology_store(store_path, start_date, len(date_strs), grid_info)
+    
+    # Resolve carried-forward soil moisture up front, so days stay independent
+    sm_paths = _soil_moisture_paths(inputdir, date_strs)
+    
+    # Days are independent, so process them in parallel worker processes
+    if num_processes is None:
+        num_processes = min(os.cpu_count() or 1, 8)  # Cap to avoid I/O contention
+    print(f"Using {num_processes} worker processes")
+    
+    with ProcessPoolExecutor(max_workers=num_processes) as executor:
+        list(executor.map(_process_day, date_strs, repeat(inputdir), repeat(grid_info),
+                          [sm_paths[d] for d in date_strs],
+                          repeat(store_path), range(len(date_strs))))
     
     print(f"✅ Meteorological preprocessing completed for {(end_date - start_date).days + 1} days")
-    print("Saved aligned meteorology to: intermediate/daily_meteorology/")
\ No newline at end of file
+    if store_path is None:
+        print("Saved aligned meteorology to: intermediate/daily_meteorology/")
+    else:
+        import zarr
+        zarr.open_group(store_path, mode='r+').attrs['complete'] = True
+        print(f"Saved aligned meteorology to: {store_path}")
\ No newline at end of file
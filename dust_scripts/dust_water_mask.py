@@ -10,31 +10,155 @@ The script:
 2. Sets dust emissions to 0.0 in all water pixels
 3. Creates corrected output files
 
+The per-block masking is compiled with Numba when it is installed, and runs
+as a NumPy multiply otherwise.
+
 Usage:
-    python dust_scripts/dust_water_mask.py <dust_emission_file> [output_file]
+    python dust_scripts/dust_water_mask.py <dust_emission_file> [<dust_emission_file> ...] [-o output_file]
 
 Arguments:
-    dust_emission_file: Path to dust emission TIFF file to correct
-    output_file: Optional output path (defaults to adding '_water_masked' suffix)
+    dust_emission_file: Path(s) to dust emission TIFF files to correct. Files on
+        the same grid share one land use warp.
+    -o/--output: Optional output path for a single input file (defaults to
+        adding '_water_masked' suffix)
 
 Example:
     python dust_scripts/dust_water_mask.py outputs/dust_emissions.tiff
-    python dust_scripts/dust_water_mask.py outputs/dust_emissions.tiff outputs/dust_emissions_corrected.tiff
+    python dust_scripts/dust_water_mask.py outputs/dust_emissions.tiff -o outputs/dust_emissions_corrected.tiff
+    python dust_scripts/dust_water_mask.py outputs/uk_results/*/dust_emissions.tif
 """
 
-def run(dust_emission_path, output_path=None, inputdir="."):
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # Numba is optional
+    njit = None
+
+if njit is not None:
+    @njit(cache=True, parallel=True, fastmath=True, boundscheck=False)
+    def _mask_water_numba(dust, land_mask):
+        """Multiply by the 0/1 land mask in place, rows split across threads"""
+        
+        rows, cols = dust.shape
+        for i in prange(rows):
+            for j in range(cols):
+                dust[i, j] *= land_mask[i, j]
+
+def _mask_water(dust, land_mask):
+    """Set dust to 0 in place where the uint8 land mask is 0 (water)"""
+    
+    # A multiply by 0/1 has no branch or boolean temporary
+    if njit is not None:
+        _mask_water_numba(dust, land_mask)
+    else:
+        np.multiply(dust, land_mask, out=dust)
+    return dust
+
+# Reader threads for the dust blocks (GDAL releases the GIL while reading and
+# decoding, so reads overlap each other and the mask/write in the main thread),
+# and the most blocks read ahead of the writer
+READ_THREADS = 4
+MAX_PENDING_BLOCKS = 16
+
+def _read_blocks(dust_emission_path, windows):
+    """
+    Yield (window, float32 block) for each window in order, read ahead on a
+    small thread pool
+    
+    Each thread opens its own dataset, since a rasterio dataset must not be
+    read from several threads at once.
+    """
+    import threading
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    import rasterio
+    
+    thread_data = threading.local()
+    datasets = []
+    
+    def read_block(window):
+        src = getattr(thread_data, 'src', None)
+        if src is None:
+            src = thread_data.src = rasterio.open(dust_emission_path)
+            datasets.append(src)
+        return window, src.read(1, window=window, out_dtype='float32')
+    
+    try:
+        with ThreadPoolExecutor(max_workers=READ_THREADS) as executor:
+            pending = deque()
+            for window in windows:
+                pending.append(executor.submit(read_block, window))
+                if len(pending) >= MAX_PENDING_BLOCKS:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        for src in datasets:
+            src.close()
+
+def _grids_match(src, target):
+    """True if two open rasterio datasets share the same pixel grid"""
+    return (src.shape == target.shape and
+            src.transform == target.transform and
+            src.crs == target.crs)
+
+def _land_mask_on_grid(lu_raster_path, dust_src, land_mask_cache=None):
+    """
+    0/1 uint8 land mask (water is land use value 0) on the dust raster's grid
+    
+    Land use is read directly if it is already aligned, otherwise through a
+    single in-memory warp. With a land_mask_cache dict, the mask is reused for
+    every later dust raster on the same grid.
+    """
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.vrt import WarpedVRT
+    
+    grid_key = (lu_raster_path, dust_src.crs.to_wkt() if dust_src.crs else None,
+                tuple(dust_src.transform), dust_src.shape)
+    if land_mask_cache is not None and grid_key in land_mask_cache:
+        print(f"  ✓ Reusing land mask for this grid")
+        return land_mask_cache[grid_key]
+    
+    with rasterio.open(lu_raster_path) as lu_src:
+        if _grids_match(lu_src, dust_src):
+            print(f"  ✓ Land use already on the dust emission grid, skipping alignment")
+            landuse = lu_src.read(1)
+        else:
+            print(f"  🔧 Warping land use to dust emission grid in memory...")
+            with WarpedVRT(lu_src,
+                           crs=dust_src.crs,
+                           transform=dust_src.transform,
+                           width=dust_src.width,
+                           height=dust_src.height,
+                           resampling=Resampling.nearest) as lu_vrt:  # Categorical data
+                landuse = lu_vrt.read(1)
+    
+    land_mask = (landuse != 0).view(np.uint8)
+    if land_mask_cache is not None:
+        land_mask_cache[grid_key] = land_mask
+    return land_mask
+
+def run(dust_emission_path, output_path=None, inputdir=".", land_mask_cache=None):
     """
     Mask water areas in dust emission raster
     
+    Land use is read onto the dust grid once, in memory (through a
+    nearest-neighbour WarpedVRT when the grids differ, so no aligned copy is
+    written to disk), then the dust raster is streamed block by block: each
+    block is masked and written out.
+    
     Args:
         dust_emission_path: Path to dust emission TIFF file
         output_path: Optional output path (auto-generated if None)
         inputdir: Directory containing inputs folder
+        land_mask_cache: Optional dict shared across calls, so rasters on the
+            same grid reuse one land mask instead of warping land use again
     """
     import os
-    import pygeoprocessing.geoprocessing as geop
-    from osgeo import gdal
-    import numpy as np
+    import shutil
+    import rasterio
     from pathlib import Path
     
     print(f"🌊 Masking water areas in dust emissions: {dust_emission_path}")
@@ -59,69 +183,72 @@ def run(dust_emission_path, output_path=None, inputdir="."):
     print(f"  📍 Using land use raster: {lu_raster_path}")
     print(f"  💾 Output will be saved to: {output_path}")
     
-    # Get dust emission raster info for alignment
-    dust_info = geop.get_raster_info(dust_emission_path)
-    
-    # Align land use raster to match dust emission raster
-    aligned_lu_path = "intermediate/aligned_landuse_for_water_mask.tif"
-    print(f"  🔧 Aligning land use to dust emission grid...")
-    geop.align_and_resize_raster_stack(
-        [lu_raster_path],
-        [aligned_lu_path],
-        ['near'],  # Nearest neighbor for categorical data
-        dust_info['pixel_size'],
-        bounding_box_mode=dust_info['bounding_box'],
-        target_projection_wkt=dust_info['projection_wkt']
-    )
-    
-    # Create water mask function
-    def apply_water_mask(dust_value, landuse_value):
-        """Set dust to 0 where land use is water (value 0), otherwise keep original"""
-        if landuse_value == 0:  # Water
-            return 0.0
-        else:
-            return dust_value
-    
-    apply_water_mask_v = np.vectorize(apply_water_mask)
-    
-    # Apply water mask
-    print(f"  🎯 Applying water mask...")
-    listraster = [(dust_emission_path, 1), (aligned_lu_path, 1)]
-    geop.raster_calculator(
-        base_raster_path_band_const_list=listraster,
-        local_op=apply_water_mask_v, 
-        target_raster_path=output_path,
-        datatype_target=gdal.GDT_Float32,
-        nodata_target=-1,
-        calc_raster_stats=False
-    )
-    
-    # Clean up temporary file
-    if os.path.exists(aligned_lu_path):
-        os.remove(aligned_lu_path)
-        print(f"  🧹 Cleaned up temporary alignment file")
+    with rasterio.open(dust_emission_path) as dust_src:
+        
+        # 0/1 land mask on the dust grid, built once for all blocks
+        land_mask = _land_mask_on_grid(lu_raster_path, dust_src, land_mask_cache)
+        
+        # Nothing to mask (e.g. an inland-only area): the output is the input
+        if land_mask.all():
+            print(f"  ✓ No water pixels on the dust emission grid, copying unchanged")
+            shutil.copyfile(dust_emission_path, output_path)
+            print(f"  ✅ Water masking completed: {output_path}")
+            return output_path
+        
+        profile = dust_src.profile.copy()
+        # Tiled ZSTD with the float predictor; SPARSE_OK leaves tiles that
+        # are entirely nodata unwritten
+        profile.update(driver='GTiff', dtype='float32', count=1, nodata=-1,
+                       tiled=True, blockxsize=512, blockysize=512,
+                       compress='zstd', zstd_level=1, predictor=3,
+                       sparse_ok=True, bigtiff='if_safer', num_threads='all_cpus')
+        
+        # Apply water mask: blocks are read ahead in threads, then masked and
+        # written here (the Numba kernel is itself parallel, and the output
+        # dataset has a single writer)
+        print(f"  🎯 Applying water mask...")
+        with rasterio.open(output_path, 'w', **profile) as dst:
+            windows = [window for _, window in dst.block_windows(1)]
+            for window, dust in _read_blocks(dust_emission_path, windows):
+                _mask_water(dust, land_mask[window.toslices()])
+                dst.write(dust, 1, window=window)
     
     print(f"  ✅ Water masking completed: {output_path}")
     return output_path
 
 def main():
     """Command line interface"""
+    import argparse
     import sys
     
-    if len(sys.argv) < 2:
-        print("Usage: python dust_scripts/dust_water_mask.py <dust_emission_file> [output_file]")
-        print("\nExample:")
-        print("  python dust_scripts/dust_water_mask.py outputs/dust_emissions.tiff")
-        sys.exit(1)
-    
-    dust_emission_path = sys.argv[1]
-    output_path = sys.argv[2] if len(sys.argv) > 2 else None
-    
-    try:
-        result_path = run(dust_emission_path, output_path)
-        print(f"\n🎉 Successfully created water-masked dust emissions: {result_path}")
-    except Exception as e:
-        print(f"\n❌ Error: {e}")
+    parser = argparse.ArgumentParser(description="Mask water areas in dust emission rasters")
+    parser.add_argument('dust_files', nargs='+', help="Dust emission TIFF file(s) to correct")
+    parser.add_argument('-o', '--output', help="Output path (single input file only)")
+    args = parser.parse_args()
+    
+    # The old form took the output as a second positional; that now needs -o.
+    # Two files without -o are ambiguous, so they are rejected rather than
+    # guessed at (the second may be a previous run's output)
+    if args.output is None and len(args.dust_files) == 2:
+        parser.error(f"the output path now needs -o: {args.dust_files[0]} -o {args.dust_files[1]} "
+                     "(to mask exactly two files, run once per file)")
+    
+    if args.output and len(args.dust_files) > 1:
+        parser.error("--output can only be used with a single input file")
+    
+    # One land mask per grid, shared by every file on it
+    land_mask_cache = {}
+    failed = False
+    
+    for dust_emission_path in args.dust_files:
+        try:
+            result_path = run(dust_emission_path, args.output, land_mask_cache=land_mask_cache)
+            print(f"\n🎉 Successfully created water-masked dust emissions: {result_path}")
+        except Exception as e:
+            print(f"\n❌ Error: {e}")
+            failed = True
+    
+    if failed:
         sys.exit(1)
 
 if __name__ == "__main__":
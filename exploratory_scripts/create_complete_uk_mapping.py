@@ -3,10 +3,22 @@
 Create complete mapping for UK scenarios including the non-standard codes
 """
 
+import functools
+from types import MappingProxyType
+import numpy as np
+from create_esa_mapping import build_lut
+
+# Non-standard codes mapped by assumption (see custom_mapping below)
+CUSTOM_CODES = frozenset([34,35,39,44,49,65,75,85,95,104,105,109,114,115,119,124,134,154,184,204,205,206])
+
+@functools.lru_cache(maxsize=1)
 def create_complete_uk_mapping():
     """
     Create mapping that covers ALL codes found in UK scenarios.
     For non-standard codes, make reasonable assumptions based on similar standard codes.
+    
+    Built once and cached; returned as a read-only view, since every caller
+    shares it.
     """
     
     # Start with standard ESA CCI mapping
@@ -88,13 +100,22 @@ def create_complete_uk_mapping():
         206: 0,  # Assumed: Bare area variant
     }
     
-    # Combine mappings
-    complete_mapping = {**standard_mapping, **custom_mapping}
+    # Combine mappings (standard_mapping is built here, so extend it in place
+    # rather than building a third dict)
+    complete_mapping = standard_mapping
+    complete_mapping.update(custom_mapping)
     
-    return complete_mapping
+    return MappingProxyType(complete_mapping)
+
+# Reclassify a UK scenario raster with ESA_TO_SIMPLE_LUT[esa_raster] (255 = unmapped)
+ESA_TO_SIMPLE_LUT = build_lut(create_complete_uk_mapping())
+
+# Saved alongside the mapping CSV by save_complete_mapping
+UK_LUT_FILE = "inputs/UK_ESA_CCI_to_Simple_lut.npy"
 
+@functools.lru_cache(maxsize=1)
 def create_mapping_descriptions():
-    """Create descriptions for the complete mapping"""
+    """Create descriptions for the complete mapping (cached, read-only)"""
     
     descriptions = {
         # Standard codes (abbreviated)
@@ -151,29 +172,36 @@ def create_mapping_descriptions():
         206: "Bare area variant"
     }
     
-    return descriptions
+    return MappingProxyType(descriptions)
+
+# Mapped codes in ascending order with their descriptions, sorted once so the
+# printing and CSV code iterate them in order directly. The codes are a uint16
+# array so rasters can be tested against them with np.isin(raster, MAPPED_CODES)
+MAPPED_CODES = np.array(sorted(create_complete_uk_mapping()), dtype=np.uint16)
+MAPPED_DESCRIPTIONS = tuple(create_mapping_descriptions().get(code, "Unknown") for code in MAPPED_CODES.tolist())
 
 def print_complete_mapping():
     """Print the complete mapping summary"""
     
     mapping = create_complete_uk_mapping()
-    descriptions = create_mapping_descriptions()
     
     print("Complete UK Scenario ESA CCI Mapping")
     print("=" * 50)
     
     simple_classes = {0: "Other", 1: "Cropland", 2: "Grass", 3: "Forest"}
     
+    # Group ESA codes by Simple class in one pass over the sorted codes, so
+    # each class's list is already in order
+    codes_by_class = {}
+    for esa, desc in zip(MAPPED_CODES.tolist(), MAPPED_DESCRIPTIONS):
+        codes_by_class.setdefault(mapping[esa], []).append((esa, desc))
+    
     for simple_id in [0, 1, 2, 3]:
         print(f"\n{simple_classes[simple_id]} ({simple_id}):")
         print("-" * 30)
         
-        codes_for_class = [esa for esa, simple in mapping.items() if simple == simple_id]
-        codes_for_class.sort()
-        
-        for esa_code in codes_for_class:
-            desc = descriptions.get(esa_code, "Unknown")
-            marker = " *" if esa_code in [34,35,39,44,49,65,75,85,95,104,105,109,114,115,119,124,134,154,184,204,205,206] else ""
+        for esa_code, desc in codes_by_class.get(simple_id, []):
+            marker = " *" if esa_code in CUSTOM_CODES else ""
             print(f"  {esa_code:3d}: {desc}{marker}")
     
     print(f"\nTotal codes mapped: {len(mapping)}")
@@ -184,7 +212,6 @@ def save_complete_mapping():
     import csv
     
     mapping = create_complete_uk_mapping()
-    descriptions = create_mapping_descriptions()
     
     filename = "inputs/UK_ESA_CCI_to_Simple_mapping.csv"
     
@@ -193,17 +220,20 @@ def save_complete_mapping():
         writer.writerow(['ESA_CCI_Code', 'Description', 'Simple_Class', 'Simple_Name', 'Notes'])
         
         simple_names = {0: "Other", 1: "Cropland", 2: "Grass", 3: "Forest"}
-        custom_codes = [34,35,39,44,49,65,75,85,95,104,105,109,114,115,119,124,134,154,184,204,205,206]
         
-        for esa_code in sorted(mapping.keys()):
-            desc = descriptions.get(esa_code, "Unknown")
-            simple_class = mapping[esa_code]
-            simple_name = simple_names[simple_class]
-            notes = "Non-standard code (assumption-based)" if esa_code in custom_codes else "Standard ESA CCI"
-            
-            writer.writerow([esa_code, desc, simple_class, simple_name, notes])
+        writer.writerows(
+            (esa_code,
+             desc,
+             mapping[esa_code],
+             simple_names[mapping[esa_code]],
+             "Non-standard code (assumption-based)" if esa_code in CUSTOM_CODES else "Standard ESA CCI")
+            for esa_code, desc in zip(MAPPED_CODES.tolist(), MAPPED_DESCRIPTIONS)
+        )
+    
+    np.save(UK_LUT_FILE, ESA_TO_SIMPLE_LUT)
     
     print(f"\nComplete mapping saved to: {filename}")
+    print(f"Lookup table saved to: {UK_LUT_FILE}")
 
 if __name__ == "__main__":
     print_complete_mapping()
@@ -3,6 +3,24 @@
 Create ESA CCI to Simple classification mapping based on the actual codes found in UK scenarios
 """
 
+import functools
+from types import MappingProxyType
+import numpy as np
+
+def build_lut(mapping, default=255, dtype=np.uint8):
+    """
+    Build a 256-entry lookup table from an ESA code -> Simple class mapping
+    
+    ESA CCI codes are all below 256, so a raster is reclassified with a single
+    gather, simple_raster = lut[esa_raster], instead of a per-pixel dict lookup.
+    Codes missing from the mapping get the default value.
+    """
+    lut = np.full(256, default, dtype=dtype)
+    for esa_code, simple_class in mapping.items():
+        lut[esa_code] = simple_class
+    return lut
+
+@functools.lru_cache(maxsize=1)
 def create_esa_to_simple_mapping():
     """
     Create mapping from ESA CCI codes to Simple 4-class system:
@@ -10,6 +28,9 @@ def create_esa_to_simple_mapping():
     1 = Cropland (all agricultural/crop types)  
     2 = Grass (grassland, shrubland, sparse vegetation, wetlands)
     3 = Forest (all tree cover types)
+    
+    Built once and cached; both dicts are returned as read-only views, since
+    every caller shares them.
     """
     
     # ESA CCI codes found in UK scenarios with their descriptions
@@ -103,7 +124,30 @@ def create_esa_to_simple_mapping():
         170: 3,  # Tree cover, flooded, saline water
     }
     
-    return esa_to_simple, esa_codes
+    return MappingProxyType(esa_to_simple), MappingProxyType(esa_codes)
+
+@functools.lru_cache(maxsize=None)
+def esa_to_simple_lut(default=255, dtype=np.uint8):
+    """
+    Lookup table form of create_esa_to_simple_mapping, for rasters:
+    simple_raster = esa_to_simple_lut()[esa_raster]
+    
+    Cached per (default, dtype) and read-only, so callers share one table.
+    """
+    mapping, _ = create_esa_to_simple_mapping()
+    lut = build_lut(mapping, default=default, dtype=dtype)
+    lut.flags.writeable = False
+    return lut
+
+# esa_to_simple_lut() as saved alongside the mapping CSV by save_mapping_csv;
+# load it with np.load and map a raster with one gather, lut[esa_raster]
+ESA_LUT_FILE = "inputs/ESA_CCI_to_Simple_lut.npy"
+
+# ESA codes in ascending order with their descriptions, sorted once so the
+# printing and CSV code iterate them in order directly. The codes are a uint16
+# array so rasters can be tested against them with np.isin(raster, ESA_CODES)
+ESA_CODES = np.array(sorted(create_esa_to_simple_mapping()[1]), dtype=np.uint16)
+ESA_DESCRIPTIONS = tuple(create_esa_to_simple_mapping()[1][code] for code in ESA_CODES.tolist())
 
 def print_mapping_summary():
     """Print a summary of the mapping for verification"""
@@ -115,15 +159,18 @@ def print_mapping_summary():
     # Group by Simple class
     simple_classes = {0: "Other", 1: "Cropland", 2: "Grass", 3: "Forest"}
     
+    # Group ESA codes by Simple class in one pass over the sorted codes, so
+    # each class's list is already in order
+    esa_codes_by_class = {}
+    for esa, description in zip(ESA_CODES.tolist(), ESA_DESCRIPTIONS):
+        if esa in mapping:
+            esa_codes_by_class.setdefault(mapping[esa], []).append((esa, description))
+    
     for simple_id in [0, 1, 2, 3]:
         print(f"\n{simple_classes[simple_id]} ({simple_id}):")
         print("-" * 20)
         
-        esa_codes_for_class = [esa for esa, simple in mapping.items() if simple == simple_id]
-        esa_codes_for_class.sort()
-        
-        for esa_code in esa_codes_for_class:
-            description = codes.get(esa_code, "Unknown")
+        for esa_code, description in esa_codes_by_class.get(simple_id, []):
             print(f"  {esa_code:3d}: {description}")
     
     print(f"\nTotal ESA codes mapped: {len(mapping)}")
@@ -150,14 +197,19 @@ def save_mapping_csv():
         
         simple_names = {0: "Other", 1: "Cropland", 2: "Grass", 3: "Forest"}
         
-        for esa_code in sorted(codes.keys()):
-            esa_desc = codes[esa_code]
-            simple_class = mapping.get(esa_code, -1)  # -1 for unmapped
-            simple_desc = simple_names.get(simple_class, "Unmapped")
-            
-            writer.writerow([esa_code, esa_desc, simple_class, simple_desc])
+        # -1 for unmapped codes
+        writer.writerows(
+            (esa_code,
+             esa_desc,
+             mapping.get(esa_code, -1),
+             simple_names.get(mapping.get(esa_code, -1), "Unmapped"))
+            for esa_code, esa_desc in zip(ESA_CODES.tolist(), ESA_DESCRIPTIONS)
+        )
+    
+    np.save(ESA_LUT_FILE, esa_to_simple_lut())
     
     print(f"\nMapping saved to: {filename}")
+    print(f"Lookup table saved to: {ESA_LUT_FILE}")
 
 if __name__ == "__main__":
     print_mapping_summary()
@@ -15,6 +15,9 @@ from netCDF4 import Dataset
 import os
 from pathlib import Path
 
+# Rows read per slab when scanning the Blended_SM grid
+SLAB_ROWS = 1024
+
 def debug_smops_file():
     """Debug SMOPS file to understand ocean fill values"""
     
@@ -44,56 +47,110 @@ def debug_smops_file():
             print(f"   Shape: {sm_var.shape}")
             print(f"   Data type: {sm_var.dtype}")
             
-            # Check for fill value attributes
+            # Fetch the attribute names once, then check for fill value attributes
+            sm_attrs = set(sm_var.ncattrs())
             attrs_to_check = ['_FillValue', 'missing_value', 'fill_value', 'invalid_range']
             for attr in attrs_to_check:
-                if hasattr(sm_var, attr):
-                    print(f"   {attr}: {getattr(sm_var, attr)}")
+                if attr in sm_attrs:
+                    print(f"   {attr}: {sm_var.getncattr(attr)}")
             
             # Check for valid range
-            if hasattr(sm_var, 'valid_min') and hasattr(sm_var, 'valid_max'):
-                print(f"   Valid range: {sm_var.valid_min} to {sm_var.valid_max}")
+            if 'valid_min' in sm_attrs and 'valid_max' in sm_attrs:
+                print(f"   Valid range: {sm_var.getncattr('valid_min')} to {sm_var.getncattr('valid_max')}")
             
             print()
             
-            # 2. Read the actual data
+            # 2. Stream the data in row slabs (aligned to the netCDF chunks),
+            # gathering every statistic in one pass instead of reading the
+            # whole grid and scanning it once per statistic
             print(f"📥 Reading soil moisture data...")
-            sm_data = sm_var[:]
             
-            print(f"   Data shape: {sm_data.shape}")
-            print(f"   Data type: {sm_data.dtype}")
-            print(f"   Data range: {np.nanmin(sm_data)} to {np.nanmax(sm_data)}")
+            # Read plain raw arrays rather than masked arrays (no mask to build
+            # and merge per slab). Fill values are stored unscaled, so they are
+            # matched on the raw data first, and scale_factor/add_offset are
+            # applied by hand to what is left; fill pixels show up with their
+            # raw value in the pixel samples
+            sm_var.set_auto_maskandscale(False)
+            fill_values = [sm_var.getncattr(attr) for attr in ('_FillValue', 'missing_value')
+                           if attr in sm_attrs]
+            scale_factor = sm_var.getncattr('scale_factor') if 'scale_factor' in sm_attrs else None
+            add_offset = sm_var.getncattr('add_offset') if 'add_offset' in sm_attrs else None
+            
+            def unpack(raw):
+                """Apply scale_factor/add_offset to raw values, leaving fill values raw"""
+                if scale_factor is None and add_offset is None:
+                    return raw
+                values = raw.astype(np.float64)
+                packed = ~np.isin(raw, fill_values) if fill_values else np.ones(raw.shape, dtype=bool)
+                if scale_factor is not None:
+                    values[packed] *= scale_factor
+                if add_offset is not None:
+                    values[packed] += add_offset
+                return values
+            
+            chunking = sm_var.chunking()
+            chunk_rows = chunking[0] if isinstance(chunking, list) else 1
+            slab_rows = max(1, SLAB_ROWS // chunk_rows) * chunk_rows
+            
+            total_pixels = int(np.prod(sm_var.shape))
+            nan_count = negative_count = high_count = zero_count = dry_pixels = valid_count = 0
+            fill_count = 0
+            data_min, data_max = np.inf, -np.inf
+            
+            for row_start in range(0, sm_var.shape[0], slab_rows):
+                slab = sm_var[row_start:row_start + slab_rows]
+                
+                # Only non-fill values count towards the statistics
+                values = slab.ravel()
+                if fill_values:
+                    values = values[~np.isin(values, fill_values)]
+                values = unpack(values)
+                finite = values[~np.isnan(values)]
+                fill_count += slab.size - values.size
+                valid_count += values.size
+                
+                nan_count += np.count_nonzero(np.isnan(values))
+                negative_count += np.count_nonzero(finite < 0)
+                high_count += np.count_nonzero(finite > 1)
+                zero_count += np.count_nonzero(finite == 0.0)
+                dry_pixels += np.count_nonzero(finite < 0.1)
+                if finite.size:
+                    data_min = min(data_min, finite.min())
+                    data_max = max(data_max, finite.max())
+            
+            print(f"   Data shape: {sm_var.shape}")
+            print(f"   Data type: {sm_var.dtype}")
+            print(f"   Data range: {data_min} to {data_max}")
             
             # 3. Check for special values
             print(f"\n🔍 Special Value Analysis:")
             
+            # Count fill values
+            print(f"   Fill values: {fill_count:,} / {total_pixels:,} ({fill_count/total_pixels*100:.1f}%)")
+            
             # Count NaN values
-            nan_count = np.sum(np.isnan(sm_data))
-            total_pixels = sm_data.size
             print(f"   NaN values: {nan_count:,} / {total_pixels:,} ({nan_count/total_pixels*100:.1f}%)")
             
             # Check for negative values
-            negative_count = np.sum(sm_data < 0)
             print(f"   Negative values: {negative_count:,}")
             
             # Check for values > 1 (soil moisture should be 0-1)
-            high_count = np.sum(sm_data > 1)
             print(f"   Values > 1.0: {high_count:,}")
             
             # Check for exact zero values
-            zero_count = np.sum(sm_data == 0.0)
             print(f"   Exact zero values: {zero_count:,}")
             
             # 4. Sample specific pixels (likely ocean areas)
             print(f"\n🌊 Sample Pixel Values (likely ocean areas):")
             
             # Top-left corner (likely ocean for global data)
+            n_rows, n_cols = sm_var.shape
             sample_regions = [
-                ("Top-left (0:5, 0:5)", sm_data[0:5, 0:5]),
-                ("Top-right (0:5, -5:)", sm_data[0:5, -5:]),
-                ("Bottom-left (-5:, 0:5)", sm_data[-5:, 0:5]),
-                ("Center (around mid-point)", sm_data[sm_data.shape[0]//2:sm_data.shape[0]//2+3, 
-                                                    sm_data.shape[1]//2:sm_data.shape[1]//2+3])
+                ("Top-left (0:5, 0:5)", unpack(sm_var[0:5, 0:5])),
+                ("Top-right (0:5, -5:)", unpack(sm_var[0:5, n_cols - 5:])),
+                ("Bottom-left (-5:, 0:5)", unpack(sm_var[n_rows - 5:, 0:5])),
+                ("Center (around mid-point)", unpack(sm_var[n_rows//2:n_rows//2+3, 
+                                                            n_cols//2:n_cols//2+3]))
             ]
             
             for region_name, region_data in sample_regions:
@@ -106,12 +163,10 @@ def debug_smops_file():
             
             # 5. Test the actual dry mask logic from the dust script
             print(f"\n🎯 Testing Full Dry Mask Logic:")
-            dry_mask = sm_data < 0.1
-            dry_pixels = np.sum(dry_mask)
             print(f"   Pixels marked as 'dry' (< 0.1): {dry_pixels:,} / {total_pixels:,} ({dry_pixels/total_pixels*100:.1f}%)")
             
-            # Check unique values in the dry mask
-            unique_in_mask = np.unique(dry_mask)
+            # Values present in the dry mask (fill pixels are left out)
+            unique_in_mask = [value for value, count in ((False, valid_count - dry_pixels), (True, dry_pixels)) if count]
             print(f"   Unique values in dry mask: {unique_in_mask}")
             
             # 6. Geographic context (if coordinate info available)
@@ -127,8 +182,8 @@ def debug_smops_file():
                 ocean_lon_idx = np.where((lons >= -40) & (lons <= -20))[0]
                 
                 if len(ocean_lat_idx) > 0 and len(ocean_lon_idx) > 0:
-                    ocean_sample = sm_data[ocean_lat_idx[0]:ocean_lat_idx[0]+3, 
-                                          ocean_lon_idx[0]:ocean_lon_idx[0]+3]
+                    ocean_sample = unpack(sm_var[ocean_lat_idx[0]:ocean_lat_idx[0]+3, 
+                                                 ocean_lon_idx[0]:ocean_lon_idx[0]+3])
                     print(f"   Sample Atlantic Ocean area: {ocean_sample.flatten()}")
             
     except Exception as e:
@@ -8,16 +8,114 @@ Exploratory script to examine UK scenario maps and determine:
 
 import os
 import sys
+import io
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
 import numpy as np
 import rasterio
 from pathlib import Path
 
-def examine_scenario_file(filepath):
+try:
+    from osgeo import gdal
+except ImportError:  # GDAL's own bindings are optional here
+    gdal = None
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _nan_count_numba(values):
+        """Number of NaNs, counted without a full-size boolean mask"""
+        
+        nan_count = 0
+        for value in values:
+            if np.isnan(value):
+                nan_count += 1
+        
+        return nan_count
+
+def _summary_from_histogram(histogram, dtype):
+    """Summary (see summarize_values) of a histogram indexed by value"""
+    unique_vals = np.flatnonzero(histogram).astype(dtype)
+    return SimpleNamespace(min=unique_vals[0], max=unique_vals[-1], unique=unique_vals,
+                           counts=histogram[unique_vals], nan_count=0)
+
+def summarize_values(data):
+    """
+    Range, unique values, pixel counts and NaN count of a raster array
+    
+    Every field comes from one histogram or sort of the data rather than
+    separate min, max and unique passes:
+    - unsigned 8/16-bit codes: np.bincount (unique values are its nonzero bins)
+    - other integers: np.unique with counts
+    - floats: a NaN count (compiled with Numba when installed, so no mask is
+      allocated), then np.unique, masking NaNs only if there are any
+    
+    The unique values are sorted, so min and max are their ends.
+    
+    Returns:
+        SimpleNamespace: min, max, unique, counts, nan_count (min and max
+        are None if every value is NaN)
+    """
+    
+    if data.dtype.kind == 'u' and data.dtype.itemsize <= 2:
+        return _summary_from_histogram(np.bincount(data.ravel()), data.dtype)
+    
+    if np.issubdtype(data.dtype, np.integer):
+        unique_vals, counts = np.unique(data, return_counts=True)
+        return SimpleNamespace(min=unique_vals[0], max=unique_vals[-1], unique=unique_vals,
+                               counts=counts, nan_count=0)
+    
+    if njit is not None:
+        nan_count = _nan_count_numba(data.ravel())
+    else:
+        nan_count = np.count_nonzero(np.isnan(data))
+    
+    unique_vals, counts = np.unique(data[~np.isnan(data)] if nan_count else data,
+                                    return_counts=True)
+    if unique_vals.size == 0:
+        return SimpleNamespace(min=None, max=None, unique=unique_vals, counts=counts,
+                               nan_count=nan_count)
+    
+    return SimpleNamespace(min=unique_vals[0], max=unique_vals[-1], unique=unique_vals,
+                           counts=counts, nan_count=nan_count)
+
+def _gdal_uint8_histogram(filepath):
+    """
+    Exact 256-bin histogram of band 1 of a uint8 raster, computed inside GDAL
+    (None without the GDAL bindings). Nodata pixels are counted in their own
+    bin, as when the band is read and summarized with summarize_values.
+    """
+    if gdal is None:
+        return None
+    
+    dataset = gdal.Open(str(filepath))
+    if dataset is None:
+        return None
+    
+    band = dataset.GetRasterBand(1)
+    histogram = np.array(band.GetHistogram(-0.5, 255.5, 256,
+                                           include_out_of_range=0, approx_ok=0),
+                         dtype=np.int64)
+    
+    # GDAL may leave nodata pixels out; every uint8 value falls in a bin, so
+    # the pixels missing from the histogram are the nodata ones
+    nodata = band.GetNoDataValue()
+    if nodata is not None and float(nodata).is_integer() and 0 <= nodata <= 255:
+        histogram[int(nodata)] += dataset.RasterXSize * dataset.RasterYSize - histogram.sum()
+    return histogram
+
+def examine_scenario_file(filepath, gdal_threads='ALL_CPUS'):
     """Examine a single scenario TIFF file"""
     print(f"\n=== Examining: {filepath.name} ===")
     
     try:
-        with rasterio.open(filepath) as src:
+        # Let GDAL decompress the blocks of each read on all cores
+        with rasterio.Env(GDAL_NUM_THREADS=gdal_threads), rasterio.open(filepath) as src:
             # Basic info
             print(f"Dimensions: {src.width} x {src.height}")
             print(f"Bands: {src.count}")
@@ -33,20 +131,29 @@ def examine_scenario_file(filepath):
             print(f"  South: {bounds.bottom:.6f}")
             print(f"  North: {bounds.top:.6f}")
             
-            # Read data and examine unique values
-            data = src.read(1)
+            # Unique values (sample if too many). For uint8 codes GDAL counts
+            # the pixels in its own C loop, so the raster is never read into a
+            # Python array. Otherwise the data is read and summarized in one
+            # histogram or sort. Both count nodata pixels as a value
+            histogram = _gdal_uint8_histogram(filepath) if src.dtypes[0] == 'uint8' else None
+            if histogram is not None:
+                summary = _summary_from_histogram(histogram, np.uint8)
+            else:
+                summary = summarize_values(src.read(1))
+            unique_vals = summary.unique
             
             # Basic stats
-            print(f"Data range: {data.min()} to {data.max()}")
-            print(f"Data shape: {data.shape}")
+            print(f"Data range: {summary.min} to {summary.max}")
+            print(f"Data shape: {src.shape}")
             print(f"No-data value: {src.nodata}")
+            if summary.nan_count:
+                print(f"NaN pixels: {summary.nan_count:,}")
             
-            # Unique values (sample if too many)
-            unique_vals = np.unique(data[~np.isnan(data)])
             print(f"Number of unique values: {len(unique_vals)}")
             
             if len(unique_vals) <= 50:
                 print(f"Unique values: {unique_vals}")
+                print(f"Pixel counts: {summary.counts}")
             else:
                 print(f"Sample unique values: {unique_vals[:20]}...")
                 print(f"Value range summary:")
@@ -60,7 +167,7 @@ def examine_scenario_file(filepath):
                 'bounds': bounds,
                 'crs': src.crs,
                 'unique_values': unique_vals,
-                'shape': data.shape,
+                'shape': src.shape,
                 'data_type': src.dtypes[0]
             }
             
@@ -68,6 +175,19 @@ def examine_scenario_file(filepath):
         print(f"Error reading {filepath}: {e}")
         return None
 
+# GDAL decompression threads per worker when several files are examined at once
+WORKER_GDAL_THREADS = 2
+
+def _examine_in_worker(filepath):
+    """
+    Examine one file in a worker process, returning (printed report, result)
+    so the parent prints each report whole and in file order
+    """
+    report = io.StringIO()
+    with redirect_stdout(report):
+        result = examine_scenario_file(filepath, gdal_threads=WORKER_GDAL_THREADS)
+    return report.getvalue(), result
+
 def main():
     # Path to UK scenarios
     scenario_dir = Path("scenarios/UKNatureFrontierWithAir/United Kingdom/ScenarioMaps")
@@ -87,12 +207,15 @@ def main():
     for f in tiff_files:
         print(f"  - {f.name}")
     
-    # Examine first few files in detail
+    # Examine first few files in detail, each in its own process
     results = []
-    for i, tiff_file in enumerate(tiff_files[:3]):  # Examine first 3 files
-        result = examine_scenario_file(tiff_file)
-        if result:
-            results.append(result)
+    files_to_examine = tiff_files[:3]  # Examine first 3 files
+    max_workers = min(8, os.cpu_count() or 1, len(files_to_examine))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for report, result in executor.map(_examine_in_worker, files_to_examine):
+            print(report, end='')
+            if result:
+                results.append(result)
     
     # Summary comparison
     if results:
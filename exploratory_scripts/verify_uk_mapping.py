@@ -3,34 +3,37 @@
 Verify that our ESA mapping covers all codes found in UK scenarios
 """
 
-from create_esa_mapping import create_esa_to_simple_mapping
+import numpy as np
+from create_esa_mapping import esa_to_simple_lut
 
 def main():
     # Codes found in UK scenarios (from our examination)
     uk_scenario_codes = [0, 10, 11, 12, 30, 34, 35, 39, 40, 44, 49, 60, 65, 70, 75, 80, 85, 90, 95, 100, 104, 105, 109, 110, 114, 115, 119, 120, 124, 130, 134, 150, 154, 180, 184, 190, 200, 201, 202, 204, 205, 206, 210]
     
-    # Our mapping
-    esa_to_simple, esa_codes = create_esa_to_simple_mapping()
+    # Our mapping, as a 256-entry lookup table (255 = unmapped), built from
+    # the current mapping rather than a saved copy that may be out of date
+    lut = esa_to_simple_lut()
     
     print("Verification of UK Scenario Code Coverage")
     print("=" * 50)
     print(f"Total codes in UK scenarios: {len(uk_scenario_codes)}")
-    print(f"Total codes in our mapping: {len(esa_to_simple)}")
+    print(f"Total codes in our mapping: {np.count_nonzero(lut != 255)}")
     
-    # Check coverage
-    mapped_codes = set(esa_to_simple.keys())
-    uk_codes = set(uk_scenario_codes)
+    # Check coverage with one lookup of every UK code (sorted and unique)
+    uk_codes = np.unique(uk_scenario_codes)
+    uk_classes = lut[uk_codes]
+    covered_mask = uk_classes != 255
     
-    covered = uk_codes.intersection(mapped_codes)
-    missing = uk_codes - mapped_codes
+    covered_count = np.count_nonzero(covered_mask)
+    missing = uk_codes[~covered_mask].tolist()
     
-    print(f"\nCodes covered by our mapping: {len(covered)}/{len(uk_codes)}")
-    print(f"Coverage percentage: {len(covered)/len(uk_codes)*100:.1f}%")
+    print(f"\nCodes covered by our mapping: {covered_count}/{len(uk_codes)}")
+    print(f"Coverage percentage: {covered_count/len(uk_codes)*100:.1f}%")
     
     if missing:
         print(f"\nMISSING CODES IN UK SCENARIOS:")
         print("-" * 30)
-        for code in sorted(missing):
+        for code in missing:
             print(f"  {code}: (Unknown - not in standard ESA CCI)")
     else:
         print("\n✓ All UK scenario codes are covered by our mapping!")
@@ -40,14 +43,15 @@ def main():
     print("-" * 50)
     
     simple_names = {0: "Other", 1: "Cropland", 2: "Grass", 3: "Forest"}
-    class_counts = {0: 0, 1: 0, 2: 0, 3: 0}
     
-    for code in covered:
-        simple_class = esa_to_simple[code]
-        class_counts[simple_class] += 1
+    # uk_codes is sorted, so the covered codes (and each class's codes
+    # below) come out in order
+    covered_codes = uk_codes[covered_mask]
+    covered_classes = uk_classes[covered_mask]
+    class_counts = np.bincount(covered_classes, minlength=4)
     
-    for simple_id, count in class_counts.items():
-        percentage = count / len(covered) * 100
+    for simple_id, count in enumerate(class_counts.tolist()):
+        percentage = count / covered_count * 100
         print(f"{simple_names[simple_id]:>8} ({simple_id}): {count:2d} codes ({percentage:4.1f}%)")
     
     # Show which specific codes fall into each category
@@ -55,8 +59,7 @@ def main():
     print("-" * 30)
     
     for simple_id in [0, 1, 2, 3]:
-        uk_codes_for_class = [code for code in covered if esa_to_simple[code] == simple_id]
-        uk_codes_for_class.sort()
+        uk_codes_for_class = covered_codes[covered_classes == simple_id].tolist()
         print(f"{simple_names[simple_id]} ({simple_id}): {uk_codes_for_class}")
 
 if __name__ == "__main__":
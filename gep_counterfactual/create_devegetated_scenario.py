@@ -12,12 +12,68 @@ Usage:
 
 Input:  inputs/gblulcg20_reprojected_10000.tif (global IGBP land use)
 Output: inputs/gblulcg20_10000_devegetated.tif (counterfactual scenario)
+
+Each block is converted and counted in one sweep by a Numba kernel when Numba
+is installed, and with NumPy otherwise.
 """
 
 import rasterio
 import numpy as np
 from pathlib import Path
 
+try:
+    from numba import njit, prange
+except ImportError:  # Numba is optional
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _devegetate_block_numba(block, lut, counts_orig):
+        """Histogram the original codes and apply the lookup table in place"""
+        
+        rows, cols = block.shape
+        # One histogram row per block row, so threads never share counters
+        row_counts_orig = np.zeros((rows, 256), dtype=np.int64)
+        
+        for i in prange(rows):
+            for j in range(cols):
+                code = block[i, j]
+                block[i, j] = lut[code]
+                row_counts_orig[i, code] += 1
+        
+        for i in range(rows):
+            for code in range(256):
+                counts_orig[code] += row_counts_orig[i, code]
+
+def devegetate_block(block, lut, counts_orig):
+    """
+    Convert a uint8 land use block in place through the lookup table, adding
+    its original codes to the running 256-bin histogram
+    
+    Returns:
+        np.ndarray: the converted block (the same array)
+    """
+    
+    if njit is not None:
+        _devegetate_block_numba(block, lut, counts_orig)
+        return block
+    
+    counts_orig += np.bincount(block.ravel(), minlength=256)
+    # uint8 codes always index the 256-entry table, so mode='clip' never
+    # clips; unlike the default mode it writes straight into out, with no
+    # temporary block
+    return np.take(lut, block, out=block, mode='clip')
+
+def converted_counts(counts_orig, lut):
+    """
+    Histogram of the codes after conversion, derived from the original
+    histogram: each code's count moves to the code the lookup table maps it to
+    """
+    
+    counts_final = np.zeros_like(counts_orig)
+    np.add.at(counts_final, lut, counts_orig)
+    return counts_final
+
 def create_devegetated_scenario():
     """
     Convert all vegetation (trees, grassland, shrubland) to barren land.
@@ -65,56 +121,30 @@ def create_devegetated_scenario():
     for code, name in vegetation_codes.items():
         print(f"   {code:2d} → {barren_code} : {name}")
     
-    # Read input raster
-    with rasterio.open(input_file) as src:
-        # Read the land use data
-        land_use = src.read(1)
-        profile = src.profile.copy()
+    # Lookup table indexed by land use code: vegetation maps to barren, all
+    # other codes to themselves
+    devegetation_lut = np.arange(256, dtype=np.uint8)
+    devegetation_lut[list(vegetation_codes.keys())] = barren_code
+    
+    # Stream the input raster block by block, so neither the input nor the
+    # output is held in memory as a full array (GDAL decompresses on all cores).
+    # The block cache (MB) holds a full 512-row band of a striped input, so
+    # reading it tile by tile decodes each strip once
+    with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS', GDAL_CACHEMAX=512), \
+         rasterio.open(input_file) as src:
         
         print(f"\n📊 Input data statistics:")
         print(f"   Dimensions: {src.width} x {src.height}")
         print(f"   CRS: {src.crs}")
         print(f"   Data type: {src.dtypes[0]}")
         
-        # Get original statistics
-        unique_orig, counts_orig = np.unique(land_use, return_counts=True)
-        total_pixels = land_use.size
-        
-        print(f"   Original unique values: {len(unique_orig)}")
-        
-        # Count vegetation pixels before conversion
-        vegetation_pixels = 0
-        vegetation_stats = {}
+        # The 256-entry table and histogram only cover uint8 codes; wider or
+        # float codes (e.g. a -1 nodata) would be clipped or index past them
+        if src.dtypes[0] != 'uint8':
+            raise ValueError(f"Expected uint8 land use codes in {input_file}, "
+                             f"got {src.dtypes[0]}")
         
-        for veg_code in vegetation_codes.keys():
-            veg_mask = (land_use == veg_code)
-            veg_count = np.sum(veg_mask)
-            if veg_count > 0:
-                vegetation_pixels += veg_count
-                vegetation_stats[veg_code] = veg_count
-                pct = veg_count / total_pixels * 100
-                print(f"   Code {veg_code:2d} ({vegetation_codes[veg_code]}): {pct:.2f}% ({veg_count:,} pixels)")
-        
-        print(f"   Total vegetation pixels: {vegetation_pixels:,} ({vegetation_pixels/total_pixels*100:.1f}%)")
-        
-        # Create output array (copy of input)
-        land_use_devegetated = land_use.copy()
-        
-        # Convert vegetation to barren
-        for veg_code in vegetation_codes.keys():
-            vegetation_mask = (land_use == veg_code)
-            land_use_devegetated[vegetation_mask] = barren_code
-        
-        # Verify conversion
-        converted_pixels = np.sum(land_use_devegetated == barren_code) - np.sum(land_use == barren_code)
-        print(f"\n✅ Conversion complete:")
-        print(f"   Pixels converted to barren: {converted_pixels:,}")
-        print(f"   Original barren pixels: {np.sum(land_use == barren_code):,}")
-        print(f"   Total barren pixels now: {np.sum(land_use_devegetated == barren_code):,}")
-        
-        # Get final statistics
-        unique_final, counts_final = np.unique(land_use_devegetated, return_counts=True)
-        print(f"   Final unique values: {len(unique_final)}")
+        total_pixels = src.width * src.height
         
         # Create clean profile for output to avoid TIFF field conflicts
         profile = {
@@ -125,14 +155,63 @@ def create_devegetated_scenario():
             'dtype': src.dtypes[0],
             'crs': src.crs,
             'transform': src.transform,
-            'compress': 'lzw',
-            'tiled': False,
+            # Tiled so the dust pipeline's windowed reads touch only the tiles
+            # they need; ZSTD with the integer predictor suits categorical
+            # codes (written once, so a higher level costs little)
+            'tiled': True,
+            'blockxsize': 512,
+            'blockysize': 512,
+            'compress': 'zstd',
+            'zstd_level': 9,
+            'predictor': 2,
+            'num_threads': 'all_cpus',
+            'bigtiff': 'if_safer',
             'interleave': 'band'
         }
         
-        # Write output raster
+        # Histogram of the original uint8 codes, summed over blocks; the
+        # converted histogram follows from it, and every statistic below
+        # comes from these two
+        counts_orig = np.zeros(256, dtype=np.int64)
+        
+        # Write output raster one output tile at a time, so every write fills
+        # whole tiles that are compressed and flushed straight away
         with rasterio.open(output_file, 'w', **profile) as dst:
-            dst.write(land_use_devegetated, 1)
+            for _, window in dst.block_windows(1):
+                land_use = src.read(1, window=window)
+                
+                # Convert vegetation to barren and count codes in one sweep
+                land_use_devegetated = devegetate_block(land_use, devegetation_lut, counts_orig)
+                
+                dst.write(land_use_devegetated, 1, window=window)
+            
+            counts_final = converted_counts(counts_orig, devegetation_lut)
+            
+            print(f"   Original unique values: {np.count_nonzero(counts_orig)}")
+            
+            # Count vegetation pixels before conversion
+            vegetation_pixels = 0
+            vegetation_stats = {}
+            
+            for veg_code in vegetation_codes.keys():
+                veg_count = int(counts_orig[veg_code])
+                if veg_count > 0:
+                    vegetation_pixels += veg_count
+                    vegetation_stats[veg_code] = veg_count
+                    pct = veg_count / total_pixels * 100
+                    print(f"   Code {veg_code:2d} ({vegetation_codes[veg_code]}): {pct:.2f}% ({veg_count:,} pixels)")
+            
+            print(f"   Total vegetation pixels: {vegetation_pixels:,} ({vegetation_pixels/total_pixels*100:.1f}%)")
+            
+            # Verify conversion
+            converted_pixels = int(counts_final[barren_code] - counts_orig[barren_code])
+            print(f"\n✅ Conversion complete:")
+            print(f"   Pixels converted to barren: {converted_pixels:,}")
+            print(f"   Original barren pixels: {counts_orig[barren_code]:,}")
+            print(f"   Total barren pixels now: {counts_final[barren_code]:,}")
+            
+            # Get final statistics
+            print(f"   Final unique values: {np.count_nonzero(counts_final)}")
             
             # Add metadata
             dst.set_band_description(1, "IGBP Land Use - Devegetated Counterfactual")
@@ -158,36 +237,47 @@ def verify_conversion(original_file, devegetated_file):
     
     print(f"\n🔍 Verifying conversion...")
     
-    with rasterio.open(original_file) as orig_src, \
+    vegetation_codes = [11, 12, 13, 14, 15, 7, 8, 9, 20]
+    barren_code = 19
+    
+    with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS'), \
+         rasterio.open(original_file) as orig_src, \
          rasterio.open(devegetated_file) as deveg_src:
         
-        orig_data = orig_src.read(1)
-        deveg_data = deveg_src.read(1)
-        
         # Check dimensions match
-        if orig_data.shape != deveg_data.shape:
+        if orig_src.shape != deveg_src.shape:
             print(f"   ❌ Dimension mismatch!")
             return False
         
-        # Count differences
-        differences = np.sum(orig_data != deveg_data)
-        total_pixels = orig_data.size
+        total_pixels = orig_src.width * orig_src.height
         
-        print(f"   Changed pixels: {differences:,} ({differences/total_pixels*100:.1f}%)")
+        # Compare the two rasters one block at a time (on the devegetated
+        # file's tiles), so neither is held in memory as a full array
+        differences = 0
+        barren_increase = 0
+        changed_orig_counts = np.zeros(256, dtype=np.int64)
         
-        # Check that only vegetation codes were changed
-        vegetation_codes = [11, 12, 13, 14, 15, 7, 8, 9, 20]
-        barren_code = 19
+        for _, window in deveg_src.block_windows(1):
+            orig_data = orig_src.read(1, window=window)
+            deveg_data = deveg_src.read(1, window=window)
+            
+            changed_mask = (orig_data != deveg_data)
+            differences += np.count_nonzero(changed_mask)
+            changed_orig_counts += np.bincount(orig_data[changed_mask], minlength=256)
+            barren_increase += (np.count_nonzero(deveg_data == barren_code)
+                                - np.count_nonzero(orig_data == barren_code))
         
-        changed_mask = (orig_data != deveg_data)
+        print(f"   Changed pixels: {differences:,} ({differences/total_pixels*100:.1f}%)")
         
-        # All changed pixels should have been vegetation in original
-        changed_orig_values = orig_data[changed_mask]
-        valid_changes = np.all(np.isin(changed_orig_values, vegetation_codes))
+        # All changed pixels should have been vegetation in original: a
+        # histogram of their original codes must be zero outside vegetation
+        changed_orig_counts[vegetation_codes] = 0
+        valid_changes = not changed_orig_counts.any()
         
-        # All changed pixels should be barren in new version
-        changed_new_values = deveg_data[changed_mask]
-        all_barren = np.all(changed_new_values == barren_code)
+        # All changed pixels should be barren in new version. Since only
+        # vegetation (never barren) pixels changed, that holds exactly when
+        # the barren count grew by the number of changed pixels
+        all_barren = barren_increase == differences
         
         if valid_changes and all_barren:
             print(f"   ✅ Conversion verified: Only vegetation codes converted to barren")
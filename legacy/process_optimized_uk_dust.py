@@ -114,8 +114,15 @@ def setup_scenario_optimized(scenario_name, cache):
         print(f"  ❌ Setup failed for {scenario_name}: {e}")
         return False
 
-def run_optimized_dust_processing(cache, num_processes=None):
-    """Run dust processing with optimizations"""
+def run_optimized_dust_processing(cache, num_processes=None, soil_texture_shm=None, pool=None):
+    """
+    Run dust processing with optimizations
+    
+    soil_texture_shm is the soil texture shared once for all scenarios (see
+    share_soil_texture); without it each run shares its own copy. pool is a
+    worker pool shared by all scenarios (see create_worker_pool); without it
+    each run starts its own worker processes.
+    """
     
     print("⚡ Running optimized dust processing...")
     
@@ -126,9 +133,11 @@ def run_optimized_dust_processing(cache, num_processes=None):
         # 2. Restore cached soil texture
         cache.restore_cached_soil_texture()
         
-        # 3. Run parallelized dust flux calculation
+        # 3. Run parallelized dust flux calculation (daily fluxes go into one Zarr store)
         from dust_scripts.dust_2_flux_calc_parallel import run_parallel
-        successful_days = run_parallel(".", num_processes)
+        flux_store = "intermediate/flux.zarr"
+        successful_days = run_parallel(".", num_processes, flux_store_path=flux_store,
+                                       soil_texture_shm=soil_texture_shm, pool=pool)
         
         if not successful_days:
             print("  ❌ Parallel flux calculation failed")
@@ -136,7 +145,7 @@ def run_optimized_dust_processing(cache, num_processes=None):
         
         # 4. Run dust summation
         from dust_scripts.dust_3_sum import run as sum_dust
-        sum_dust(".")
+        sum_dust(".", flux_store=flux_store)
         
         print("  ✅ Optimized dust processing complete")
         return True
@@ -146,7 +155,8 @@ def run_optimized_dust_processing(cache, num_processes=None):
         traceback.print_exc()
         return False
 
-def process_scenario_optimized(scenario_name, cache, num_processes=None):
+def process_scenario_optimized(scenario_name, cache, num_processes=None, soil_texture_shm=None,
+                               pool=None):
     """Process single scenario with all optimizations"""
     
     print(f"\n{'='*70}")
@@ -160,7 +170,7 @@ def process_scenario_optimized(scenario_name, cache, num_processes=None):
         return False, 0
     
     # Step 2: Run optimized dust processing
-    if not run_optimized_dust_processing(cache, num_processes):
+    if not run_optimized_dust_processing(cache, num_processes, soil_texture_shm, pool):
         return False, 0
     
     # Step 3: Save outputs
@@ -252,31 +262,51 @@ def main():
     print(f"🕐 Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
     
+    # Multi-threaded GDAL decompression for every raster read; set in the
+    # environment so the flux worker processes inherit it
+    os.environ.setdefault('GDAL_NUM_THREADS', 'ALL_CPUS')
+    
     # 1. Setup global cache
     cache = setup_global_cache()
     print()
     
+    # Soil texture is the same for every scenario: decode, validate and place
+    # it in shared memory once for the whole batch (if it is not available
+    # yet, each run aligns and shares its own)
+    from dust_scripts.dust_2_flux_calc_parallel import (create_worker_pool, release_shared_resources,
+                                                        share_soil_texture)
+    if cache.restore_cached_soil_texture():
+        soil_texture_shm = share_soil_texture()
+    else:
+        soil_texture_shm = None
+    
     # 2. Process scenarios
     successful = []
     failed = []
     processing_times = []
     
-    for i, scenario in enumerate(scenarios, 1):
-        print(f"[{i}/{len(scenarios)}] Processing: {scenario}")
-        print("-" * 50)
-        
-        try:
-            success, proc_time = process_scenario_optimized(scenario, cache, num_processes)
-            if success:
-                successful.append(scenario)
-                processing_times.append(proc_time)
-            else:
-                failed.append(scenario)
-        except Exception as e:
-            failed.append(scenario)
-            print(f"❌ FAILED: {scenario}")
-            print(f"   Error: {str(e)}")
-            traceback.print_exc()
+    # The flux worker processes are started once and reused by every scenario
+    try:
+        with create_worker_pool(num_processes) as pool:
+            for i, scenario in enumerate(scenarios, 1):
+                print(f"[{i}/{len(scenarios)}] Processing: {scenario}")
+                print("-" * 50)
+                
+                try:
+                    success, proc_time = process_scenario_optimized(scenario, cache, num_processes,
+                                                                    soil_texture_shm, pool)
+                    if success:
+                        successful.append(scenario)
+                        processing_times.append(proc_time)
+                    else:
+                        failed.append(scenario)
+                except Exception as e:
+                    failed.append(scenario)
+                    print(f"❌ FAILED: {scenario}")
+                    print(f"   Error: {str(e)}")
+                    traceback.print_exc()
+    finally:
+        release_shared_resources(include_persistent=True)
     
     # 3. Restore global environment
     try:
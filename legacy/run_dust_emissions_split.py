@@ -22,8 +22,7 @@ def main():
         print("Completed.\n")
     
     # Step 2: Meteorology preprocessing (land-use independent, run once)
-    meteorology_dir = "intermediate/daily_meteorology"
-    if not os.path.exists(meteorology_dir) or len(os.listdir(meteorology_dir)) < 700:  # ~365 days × 2 files
+    if not dust_meteorology_preprocessing.meteorology_files_ready("intermediate/daily_meteorology"):
         print("Preprocessing meteorology for full year 2021 (one-time setup)...")
         dust_meteorology_preprocessing.run(inputdir)
         print("Completed.\n")
@@ -8,11 +8,20 @@ Saves results in: outputs/uk_results/scenario_name/dust_emissions.nc
 
 import os
 import sys
-import subprocess
 from datetime import datetime
 from pathlib import Path
 import time
 import shutil
+import traceback
+
+from setup_uk_scenario import setup as setup_scenario
+
+# Dust steps run in this process, imported once for the whole batch
+from dust_scripts import dust_1_soil_texture
+from dust_scripts import dust_2_flux_calc
+from dust_scripts import dust_3_sum
+
+inputdir = "."  # current directory (contains inputs folder)
 
 # All UK scenarios
 UK_SCENARIOS = [
@@ -41,21 +50,26 @@ def setup_directories():
     return results_dir
 
 def run_scenario_setup(scenario_name):
-    """Setup a UK scenario"""
+    """Setup a UK scenario (in this process, via setup_uk_scenario.setup)"""
     print(f"🌍 Setting up scenario: {scenario_name}")
-    cmd = ["/Users/sumilthakrar/yes/envs/luep-analysis/bin/python", 
-           "setup_uk_scenario.py", scenario_name]
-    result = subprocess.run(cmd, capture_output=True, text=True)
     
-    if result.returncode != 0:
-        print(f"  ❌ Failed to setup {scenario_name}")
+    try:
+        setup_scenario(scenario_name)
+    except Exception as e:
+        print(f"  ❌ Failed to setup {scenario_name}: {e}")
         return False
-    else:
-        print(f"  ✅ Successfully setup {scenario_name}")
-        return True
+    
+    print(f"  ✅ Successfully setup {scenario_name}")
+    return True
 
 def run_dust_processing():
-    """Run optimized dust emissions processing"""
+    """
+    Run optimized dust emissions processing
+    
+    The steps of run_dust_emissions_optimized.py are called directly rather
+    than in a new Python process per scenario, so interpreter startup and the
+    numpy/GDAL/rasterio imports happen once per batch.
+    """
     print(f"  📊 Running optimized dust emissions processing...")
     
     # Check if soil texture already exists
@@ -65,40 +79,45 @@ def run_dust_processing():
     else:
         print(f"    🔧 Creating soil texture (one-time setup)")
     
-    cmd = ["/Users/sumilthakrar/yes/envs/luep-analysis/bin/python", "run_dust_emissions_optimized.py"]
-    
     start_time = time.time()
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    end_time = time.time()
-    
-    duration = end_time - start_time
-    
-    if result.returncode != 0:
+    try:
+        if not soil_texture_exists:
+            dust_1_soil_texture.run(inputdir)
+        dust_2_flux_calc.run(inputdir)
+        dust_3_sum.run(inputdir)
+    except Exception as e:
+        duration = time.time() - start_time
         print(f"    ❌ Dust processing failed ({duration:.1f}s)")
-        print(f"    Error: {result.stderr}")
+        print(f"    Error: {e}")
+        traceback.print_exc()
         return False, duration
-    else:
-        print(f"    ✅ Dust processing completed ({duration:.1f}s)")
-        return True, duration
+    
+    duration = time.time() - start_time
+    print(f"    ✅ Dust processing completed ({duration:.1f}s)")
+    return True, duration
 
 def save_scenario_results(scenario_name, results_dir):
     """Save results with proper folder organization"""
     scenario_dir = results_dir / scenario_name
     scenario_dir.mkdir(exist_ok=True)
     
-    outputs_path = Path("outputs")
     saved_files = []
     
-    if outputs_path.exists():
-        for file_path in outputs_path.glob("*"):
-            if file_path.is_file() and file_path.name != "txt":
-                if "dust" in file_path.name:
-                    if file_path.suffix == ".tiff":
-                        new_name = "dust_emissions.tif"
-                        target_path = scenario_dir / new_name
-                        shutil.move(str(file_path), str(target_path))
-                        saved_files.append(new_name)
-                        print(f"      Saved: {scenario_name}/{new_name}")
+    if os.path.isdir("outputs"):
+        # One directory scan; DirEntry caches the file type, so no stat per entry
+        with os.scandir("outputs") as entries:
+            for entry in entries:
+                if "dust" in entry.name and entry.name.endswith(".tiff") and entry.is_file():
+                    new_name = "dust_emissions.tif"
+                    target_path = scenario_dir / new_name
+                    # Same filesystem, so a rename (replacing an earlier result);
+                    # shutil.move only for a cross-device outputs/uk_results
+                    try:
+                        os.replace(entry.path, target_path)
+                    except OSError:
+                        shutil.move(entry.path, str(target_path))
+                    saved_files.append(new_name)
+                    print(f"      Saved: {scenario_name}/{new_name}")
     
     return len(saved_files)
 
@@ -15,14 +15,35 @@ Target: Reduce 45 min/scenario to 15-20 min/scenario for single runs,
 import os
 import sys
 import time
-import subprocess
 import shutil
 import multiprocessing
+import tempfile
+import json
 from pathlib import Path
 from datetime import datetime
 import concurrent.futures
 import traceback
 
+from setup_uk_scenario import setup as setup_scenario
+
+try:
+    import psutil
+except ImportError:  # psutil is optional
+    psutil = None
+
+# Written per scenario by the setup step; the rest of inputs/ is shared
+# read-only with the worker scratch directories
+SCENARIO_INPUTS = {"gblulcg20_10000.tif", "scenario_landuse_esa_cci.tif"}
+
+# Rough peak memory of one scenario worker, used to cap parallel workers
+SCENARIO_MEMORY_BYTES = 2 * 1024 ** 3
+
+# Per-scenario completion marker and batch progress log, so a rerun skips
+# scenarios that already finished (unless --force)
+RESULTS_DIR = Path("outputs/uk_results")
+DONE_MARKER = ".done"
+PROGRESS_LOG = RESULTS_DIR / "_progress.jsonl"
+
 def get_uk_scenarios():
     """Get list of all UK scenarios"""
     return [
@@ -43,6 +64,26 @@ def get_uk_scenarios():
         "all_urban"
     ]
 
+def scenario_done(scenario_name):
+    """True if an earlier run finished scenario_name"""
+    return (RESULTS_DIR / scenario_name / DONE_MARKER).exists()
+
+def log_progress(scenario_name, success, proc_time):
+    """Append one line for a finished scenario to the progress log"""
+    
+    PROGRESS_LOG.parent.mkdir(parents=True, exist_ok=True)
+    with open(PROGRESS_LOG, 'a') as f:
+        f.write(json.dumps({'scenario': scenario_name, 'ok': success, 't': proc_time,
+                            'finished': datetime.now().isoformat(timespec='seconds')}) + '\n')
+
+def _existing_names(directory):
+    """Names in directory from one os.scandir (empty if it does not exist)"""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
 def backup_global_files():
     """Backup global files for restoration"""
     
@@ -71,9 +112,11 @@ def restore_global_files():
         "gblulcg20_10000.tif": "inputs/gblulcg20_10000.tif"
     }
     
+    existing = _existing_names(backup_dir)
+    
     for backup_name, target_path in files_to_restore.items():
         backup_file = backup_dir / backup_name
-        if backup_file.exists():
+        if backup_name in existing:
             target_dir = os.path.dirname(target_path)
             if target_dir:  # Only create directory if there is one
                 os.makedirs(target_dir, exist_ok=True)
@@ -81,6 +124,21 @@ def restore_global_files():
     
     print("🔄 Restored global files")
 
+def _link_or_copy(src, dst):
+    """
+    Hardlink src to dst, falling back to a copy across filesystems
+    
+    The soil texture rasters are only read by dust processing, so a link is
+    as good as a copy. An existing dst is replaced.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
 def setup_shared_cache():
     """Setup shared cache for multi-scenario optimization"""
     
@@ -94,11 +152,15 @@ def setup_shared_cache():
     
     cached_count = 0
     
+    # One scan of each directory instead of an exists() per file
+    existing_sources = _existing_names("intermediate")
+    cached = _existing_names(cache_dir)
+    
     for src_path, cache_name in shared_files.items():
-        if Path(src_path).exists():
+        if os.path.basename(src_path) in existing_sources:
             cache_file = cache_dir / cache_name
-            if not cache_file.exists():
-                shutil.copy2(src_path, cache_file)
+            if cache_name not in cached:
+                _link_or_copy(src_path, cache_file)
                 cached_count += 1
     
     if cached_count > 0:
@@ -115,19 +177,20 @@ def restore_shared_cache(cache_dir):
     }
     
     restored_count = 0
+    cached = _existing_names(cache_dir)
     
     for cache_name, target_path in shared_files.items():
         cache_file = cache_dir / cache_name
-        if cache_file.exists():
+        if cache_name in cached:
             os.makedirs(os.path.dirname(target_path), exist_ok=True)
-            shutil.copy2(cache_file, target_path)
+            _link_or_copy(cache_file, target_path)
             restored_count += 1
     
     if restored_count > 0:
         print(f"♻️  Restored {restored_count} shared files from cache")
 
-def run_dust_processing_optimized():
-    """Run dust processing with the corrected land use mapping"""
+def run_dust_processing_optimized(inputdir=".", output_tiff="./outputs/dust_sum_resolution_corrected.tiff"):
+    """Run dust processing with the corrected land use mapping, writing the total to output_tiff"""
     
     try:
         print("⚡ Running optimized dust emissions processing...")
@@ -137,8 +200,6 @@ def run_dust_processing_optimized():
         from dust_scripts import dust_2_flux_calc  # This now has the corrected land use mapping AND resolution correction
         from dust_scripts import dust_3_sum_resolution_corrected as dust_3_sum
         
-        inputdir = "."
-        
         # Step 1: Soil texture (cached if available)
         if not os.path.exists("intermediate/aligned_soil_texture.tif"):
             print("  📍 Step 1: Finding soil texture...")
@@ -155,7 +216,7 @@ def run_dust_processing_optimized():
         
         # Step 3: Sum to annual total
         print("  📍 Step 3: Calculating total dust emissions...")
-        dust_3_sum.run(inputdir)
+        dust_3_sum.run(inputdir, output_tiff=output_tiff)
         
         print("  ✅ Dust processing completed successfully")
         return True
@@ -165,8 +226,15 @@ def run_dust_processing_optimized():
         traceback.print_exc()
         return False
 
-def process_single_scenario_optimized(scenario_name, shared_cache_dir):
-    """Process a single scenario with optimizations"""
+def process_single_scenario_optimized(scenario_name, shared_cache_dir, inputdir=".",
+                                      results_dir=RESULTS_DIR):
+    """
+    Process a single scenario with optimizations
+    
+    Works on grid.tif, inputs/ and intermediate/ in the current directory,
+    which is inputdir (a worker scratch directory when run in parallel).
+    Results are saved under results_dir/scenario_name.
+    """
     
     scenario_start = time.time()
     
@@ -178,11 +246,11 @@ def process_single_scenario_optimized(scenario_name, shared_cache_dir):
         print(f"Setting up {scenario_name}...")
         setup_start = time.time()
         
-        subprocess.run([
-            "/Users/sumilthakrar/yes/envs/rasters/bin/python", 
-            "setup_uk_scenario.py", 
-            scenario_name
-        ], check=True, capture_output=True, text=True)
+        try:
+            setup_scenario(scenario_name)
+        except Exception as e:
+            print(f"  ❌ Setup failed for {scenario_name}: {e}")
+            return False, 0
         
         setup_time = time.time() - setup_start
         print(f"  ✅ Setup completed in {setup_time:.1f}s")
@@ -190,35 +258,24 @@ def process_single_scenario_optimized(scenario_name, shared_cache_dir):
         # 2. Restore shared cache
         restore_shared_cache(shared_cache_dir)
         
-        # 3. Run dust processing
+        # 3. Run dust processing, writing the total straight into the
+        # scenario's results folder (no copy out of outputs/)
+        output_dir = Path(results_dir) / scenario_name
+        output_dir.mkdir(parents=True, exist_ok=True)
+        target_path = output_dir / "dust_emissions_corrected.tif"
+        target_path.unlink(missing_ok=True)  # so a stale result is never reported
+        done_marker = output_dir / DONE_MARKER
+        done_marker.unlink(missing_ok=True)
+        
         processing_start = time.time()
-        success = run_dust_processing_optimized()
+        success = run_dust_processing_optimized(inputdir, output_tiff=target_path)
         processing_time = time.time() - processing_start
         
         if not success:
             return False, 0
         
-        # 4. Save outputs
-        output_dir = Path(f"outputs/uk_results/{scenario_name}")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Copy dust output (check multiple possible names)
-        dust_files = [
-            "outputs/dust_emissions.tiff", 
-            "outputs/dust_emissions.tif",
-            "outputs/dust_sum.tiff",
-            "outputs/dust_sum.tif"
-        ]
-        dust_output = None
-        for dust_file in dust_files:
-            if os.path.exists(dust_file):
-                dust_output = dust_file
-                break
-        
-        if dust_output:
-            target_path = output_dir / "dust_emissions_corrected.tif"
-            shutil.copy2(dust_output, target_path)
-            
+        # 4. Summarize outputs
+        if target_path.exists():
             scenario_time = time.time() - scenario_start
             
             # Create summary
@@ -246,6 +303,8 @@ def process_single_scenario_optimized(scenario_name, shared_cache_dir):
                 f.write("2 (Grass): Moderate dust\n")
                 f.write("3 (Forest): No dust emissions\n")
             
+            done_marker.write_text(datetime.now().isoformat(timespec='seconds'))
+            
             print(f"  ✅ SUCCESS: {scenario_name}")
             print(f"     Total time: {scenario_time:.1f}s ({scenario_time/60:.1f}m)")
             print(f"     Output: {target_path}")
@@ -255,9 +314,6 @@ def process_single_scenario_optimized(scenario_name, shared_cache_dir):
             print(f"  ❌ No dust output found for {scenario_name}")
             return False, 0
             
-    except subprocess.CalledProcessError as e:
-        print(f"  ❌ Setup failed for {scenario_name}: {e}")
-        return False, 0
     except Exception as e:
         print(f"  ❌ Processing failed for {scenario_name}: {e}")
         traceback.print_exc()
@@ -275,6 +331,7 @@ def process_scenarios_sequential(scenarios, shared_cache_dir):
         print("=" * 70)
         
         success, proc_time = process_single_scenario_optimized(scenario, shared_cache_dir)
+        log_progress(scenario, success, proc_time)
         
         if success:
             successful.append(scenario)
@@ -284,8 +341,92 @@ def process_scenarios_sequential(scenarios, shared_cache_dir):
     
     return successful, failed, processing_times
 
-def process_scenarios_parallel(scenarios, shared_cache_dir, max_workers=2):
-    """Process scenarios in parallel (limited by I/O constraints)"""
+def available_memory_bytes():
+    """Available physical memory in bytes, or None if it cannot be determined"""
+    
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def default_workers(num_scenarios):
+    """
+    Half the CPUs available to this process (scenarios are I/O heavy), at
+    most one per scenario
+    """
+    
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 2
+    return max(1, min(num_scenarios, cpus // 2))
+
+def prepare_worker_dir(base_dir, shared_cache_dir):
+    """
+    Create an isolated scratch working directory for one scenario
+    
+    The pipeline reads and writes grid.tif, inputs/ and intermediate/
+    relative to the working directory, so parallel scenarios each get their
+    own. scenarios/ and the entries of inputs/ are symlinked to the shared
+    originals, except the land use files the setup step rewrites. The
+    directory is created next to the shared cache, on the same filesystem.
+    """
+    
+    scratch_dir = Path(tempfile.mkdtemp(prefix="dust_worker_", dir=shared_cache_dir.parent))
+    
+    os.symlink(base_dir / "scenarios", scratch_dir / "scenarios")
+    (scratch_dir / "inputs").mkdir()
+    with os.scandir(base_dir / "inputs") as entries:
+        for entry in entries:
+            if entry.name not in SCENARIO_INPUTS:
+                os.symlink(entry.path, scratch_dir / "inputs" / entry.name)
+    (scratch_dir / "intermediate").mkdir()
+    (scratch_dir / "outputs").mkdir()
+    
+    return scratch_dir
+
+def _process_scenario_in_worker_dir(scenario, shared_cache_dir, base_dir):
+    """Process one scenario in its own scratch directory (worker process)"""
+    
+    # A relative entry on sys.path would stop resolving after the chdir
+    if str(base_dir) not in sys.path:
+        sys.path.insert(0, str(base_dir))
+    
+    scratch_dir = prepare_worker_dir(base_dir, shared_cache_dir)
+    os.chdir(scratch_dir)
+    try:
+        return scenario, process_single_scenario_optimized(
+            scenario, shared_cache_dir, inputdir=str(scratch_dir),
+            results_dir=base_dir / "outputs" / "uk_results")
+    except Exception as e:
+        print(f"❌ Error processing {scenario}: {e}")
+        return scenario, (False, 0)
+    finally:
+        os.chdir(base_dir)
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+def process_scenarios_parallel(scenarios, shared_cache_dir, max_workers=None):
+    """
+    Process scenarios in parallel worker processes
+    
+    Each worker runs its scenario in a scratch directory, so scenarios do not
+    race on grid.tif, inputs/ or intermediate/, and the global files in the
+    repository are left untouched. Workers are capped by available memory.
+    """
+    
+    base_dir = Path.cwd()
+    shared_cache_dir = Path(shared_cache_dir).resolve()
+    
+    if max_workers is None:
+        max_workers = default_workers(len(scenarios))
+    max_workers = min(max_workers, len(scenarios))
+    available = available_memory_bytes()
+    if available is not None:
+        max_workers = min(max_workers, available // SCENARIO_MEMORY_BYTES)
+    max_workers = max(1, max_workers)
     
     print(f"🚀 Running parallel processing with {max_workers} workers")
     
@@ -293,16 +434,10 @@ def process_scenarios_parallel(scenarios, shared_cache_dir, max_workers=2):
     failed = []
     processing_times = []
     
-    def process_with_error_handling(scenario):
-        try:
-            return scenario, process_single_scenario_optimized(scenario, shared_cache_dir)
-        except Exception as e:
-            print(f"❌ Error processing {scenario}: {e}")
-            return scenario, (False, 0)
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
         # Submit all scenarios
-        futures = {executor.submit(process_with_error_handling, scenario): scenario 
+        futures = {executor.submit(_process_scenario_in_worker_dir, scenario,
+                                   shared_cache_dir, base_dir): scenario
                   for scenario in scenarios}
         
         # Process results as they complete
@@ -310,6 +445,7 @@ def process_scenarios_parallel(scenarios, shared_cache_dir, max_workers=2):
             scenario, (success, proc_time) = future.result()
             
             print(f"[{i}/{len(scenarios)}] Completed: {scenario}")
+            log_progress(scenario, success, proc_time)
             
             if success:
                 successful.append(scenario)
@@ -340,23 +476,35 @@ def main():
     else:
         scenarios = get_uk_scenarios()
     
+    # Skip scenarios finished by an earlier run, unless --force
+    all_scenarios = scenarios
+    if "--force" in sys.argv:
+        already_done = []
+    else:
+        already_done = [scenario for scenario in scenarios if scenario_done(scenario)]
+        scenarios = [scenario for scenario in scenarios if scenario not in already_done]
+    
     parallel = "--parallel" in sys.argv
     if parallel:
-        max_workers = 2  # Conservative for I/O intensive tasks
+        max_workers = default_workers(len(scenarios))
         if "--workers" in sys.argv:
             idx = sys.argv.index("--workers")
             if idx + 1 < len(sys.argv):
                 max_workers = int(sys.argv[idx + 1])
     
     print(f"📋 Processing {len(scenarios)} scenario(s)")
+    if already_done:
+        print(f"⏭️  Skipping {len(already_done)} already completed (use --force to redo)")
     print(f"⚡ Mode: {'Parallel' if parallel else 'Sequential'}")
     if parallel:
         print(f"👥 Workers: {max_workers}")
     print(f"🕐 Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
     
-    # 1. Backup global state
-    backup_global_files()
+    # 1. Backup global state (parallel workers use scratch directories and
+    # leave the global files alone)
+    if not parallel:
+        backup_global_files()
     
     # 2. Setup shared cache
     shared_cache_dir = setup_shared_cache()
@@ -382,7 +530,8 @@ def main():
         )
     
     # 5. Restore global state
-    restore_global_files()
+    if not parallel:
+        restore_global_files()
     
     # 6. Final summary
     total_time = time.time() - start_time
@@ -390,7 +539,8 @@ def main():
     print(f"\n{'='*70}")
     print("🎉 OPTIMIZED BATCH PROCESSING SUMMARY")
     print(f"{'='*70}")
-    print(f"Total scenarios: {len(scenarios)}")
+    print(f"Total scenarios: {len(all_scenarios)}")
+    print(f"Already done (skipped): {len(already_done)}")
     print(f"Successful: {len(successful)}")
     print(f"Failed: {len(failed)}")
     print(f"Total batch time: {total_time:.1f}s ({total_time/60:.1f}m)")
@@ -8,11 +8,19 @@ Saves results in: outputs/uk_results/scenario_name/dust_emissions.nc
 import os
 import sys
 import subprocess
+import collections
 from datetime import datetime
 from pathlib import Path
 import time
 import shutil
 
+from setup_uk_scenario import setup as setup_scenario
+
+# Dust processing output kept for the error report: the last lines, and at
+# most this many characters of them
+OUTPUT_TAIL_LINES = 200
+OUTPUT_TAIL_CHARS = 4096
+
 # UK scenarios to test with (subset)
 UK_SCENARIOS = [
     "extensification_current_practices",
@@ -29,43 +37,73 @@ def setup_directories():
     print(f"📁 Results will be saved to: {results_dir.absolute()}")
     return results_dir
 
+class ScenarioError(RuntimeError):
+    """A scenario step failed; output_tail holds the end of its output"""
+    
+    def __init__(self, message, output_tail=""):
+        super().__init__(message)
+        self.output_tail = output_tail
+
 def run_scenario_setup(scenario_name):
-    """Setup a UK scenario"""
+    """
+    Setup a UK scenario (in this process, via setup_uk_scenario.setup)
     
+    Raises:
+        ScenarioError: If the setup fails
+    """
     print(f"🌍 Setting up scenario: {scenario_name}")
     
-    cmd = ["/Users/sumilthakrar/yes/envs/luep-analysis/bin/python", 
-           "setup_uk_scenario.py", scenario_name]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    try:
+        setup_scenario(scenario_name)
+    except Exception as e:
+        raise ScenarioError(f"Failed to setup {scenario_name}: {e}") from e
     
-    if result.returncode != 0:
-        print(f"  ❌ Failed to setup {scenario_name}")
-        return False
-    else:
-        print(f"  ✅ Successfully setup {scenario_name}")
-        return True
+    print(f"  ✅ Successfully setup {scenario_name}")
+
+def run_streaming(cmd):
+    """
+    Run cmd, echoing its output as it is produced rather than buffering it
+
+    stderr is merged into stdout (two pipes read in turn can deadlock), and
+    only the last lines are kept, for the error.
+
+    Raises:
+        ScenarioError: If cmd exits with a non-zero status, with at most
+            OUTPUT_TAIL_CHARS of its final output
+    """
+    output_tail = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          text=True, bufsize=1) as process:
+        for line in process.stdout:
+            print(f"    {line}", end="")
+            output_tail.append(line)
+        returncode = process.wait()
+    
+    if returncode != 0:
+        raise ScenarioError(f"{' '.join(cmd)} exited with status {returncode}",
+                            "".join(output_tail)[-OUTPUT_TAIL_CHARS:])
 
 def run_dust_processing():
-    """Run dust emissions processing"""
+    """
+    Run dust emissions processing
+    
+    Returns:
+        float: Duration in seconds
+    
+    Raises:
+        ScenarioError: If the processing fails (see run_streaming)
+    """
     
     print(f"  📊 Running dust emissions processing...")
     
     cmd = ["/Users/sumilthakrar/yes/envs/luep-analysis/bin/python", "run_dust_emissions.py"]
     
     start_time = time.time()
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    end_time = time.time()
-    
-    duration = end_time - start_time
-    
-    if result.returncode != 0:
-        print(f"    ❌ Dust processing failed ({duration:.1f}s)")
-        print(f"    Error: {result.stderr}")
-        return False, duration
-    else:
-        print(f"    ✅ Dust processing completed ({duration:.1f}s)")
-        return True, duration
+    run_streaming(cmd)
+    
+    duration = time.time() - start_time
+    print(f"    ✅ Dust processing completed ({duration:.1f}s)")
+    return duration
 
 def save_scenario_results(scenario_name, results_dir):
     """Save results with PROPER folder organization"""
@@ -75,27 +113,36 @@ def save_scenario_results(scenario_name, results_dir):
     scenario_dir.mkdir(exist_ok=True)
     
     # Move and rename files according to proper structure
-    outputs_path = Path("outputs")
     saved_files = []
     
-    if outputs_path.exists():
-        for file_path in outputs_path.glob("*"):
-            if file_path.is_file() and file_path.name != "txt":
-                if "dust" in file_path.name:
-                    # Rename to proper format: dust_emissions.nc (no scenario prefix)
-                    if file_path.suffix == ".nc":
-                        new_name = "dust_emissions.nc"
-                    elif file_path.suffix == ".tif":
-                        new_name = "dust_emissions.tif"
-                    else:
-                        continue
-                    
-                    target_path = scenario_dir / new_name
-                    
-                    # Move file
-                    shutil.move(str(file_path), str(target_path))
-                    saved_files.append(new_name)
-                    print(f"      Saved: {scenario_name}/{new_name}")
+    if os.path.isdir("outputs"):
+        # One directory scan; DirEntry caches the file type, so no stat per entry
+        with os.scandir("outputs") as entries:
+            for entry in entries:
+                if "dust" not in entry.name:
+                    continue
+                
+                # Rename to proper format: dust_emissions.nc (no scenario prefix)
+                if entry.name.endswith(".nc"):
+                    new_name = "dust_emissions.nc"
+                elif entry.name.endswith(".tif"):
+                    new_name = "dust_emissions.tif"
+                else:
+                    continue
+                
+                if not entry.is_file():
+                    continue
+                
+                target_path = scenario_dir / new_name
+                
+                # Same filesystem, so a rename (replacing an earlier result);
+                # shutil.move only for a cross-device outputs/uk_results
+                try:
+                    os.replace(entry.path, target_path)
+                except OSError:
+                    shutil.move(entry.path, str(target_path))
+                saved_files.append(new_name)
+                print(f"      Saved: {scenario_name}/{new_name}")
     
     return len(saved_files)
 
@@ -108,6 +155,7 @@ def main():
     
     # Setup directories
     results_dir = setup_directories()
+    failures = {}
     
     for i, scenario in enumerate(UK_SCENARIOS, 1):
         
@@ -115,21 +163,26 @@ def main():
         print(f"SCENARIO {i}/{len(UK_SCENARIOS)}: {scenario}")
         print(f"{'='*50}")
         
-        # Setup scenario
-        if not run_scenario_setup(scenario):
+        try:
+            run_scenario_setup(scenario)
+            run_dust_processing()
+        except ScenarioError as e:
+            print(f"  ❌ {e}")
+            failures[scenario] = e
             continue
         
-        # Run dust processing
-        success, duration = run_dust_processing()
-        
-        if success:
-            # Save results with proper organization
-            num_files = save_scenario_results(scenario, results_dir)
-            print(f"  📁 Saved {num_files} files to: outputs/uk_results/{scenario}/")
-        else:
-            print(f"  ❌ Processing failed")
-    
-    print(f"\n✅ Testing completed!")
+        # Save results with proper organization
+        num_files = save_scenario_results(scenario, results_dir)
+        print(f"  📁 Saved {num_files} files to: outputs/uk_results/{scenario}/")
+    
+    # The full output was streamed above; repeat only the end of each
+    # failed run here, where it is not lost among later scenarios
+    for scenario, error in failures.items():
+        print(f"\n❌ {scenario}: {error}")
+        if error.output_tail:
+            print(error.output_tail)
+    
+    print(f"\n✅ Testing completed! ({len(UK_SCENARIOS) - len(failures)}/{len(UK_SCENARIOS)} scenarios succeeded)")
     print(f"📁 Check structure: outputs/uk_results/")
 
 if __name__ == "__main__":
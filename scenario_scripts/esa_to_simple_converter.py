@@ -73,6 +73,38 @@ def load_uk_esa_mapping():
     
     return uk_mapping
 
+def mapping_lut(mapping):
+    """
+    Build a lookup table indexed by ESA code from an ESA -> Simple mapping
+    
+    Codes missing from the mapping (and the extra last entry, which values
+    past the largest code are clipped onto) are 0 (Other/No Data).
+    """
+    
+    lut = np.zeros(max(256, max(mapping) + 2), dtype=np.uint8)
+    lut[list(mapping.keys())] = list(mapping.values())
+    return lut
+
+def map_esa_codes(esa_data, lut):
+    """
+    Map an array of ESA codes to Simple classes through a mapping_lut table
+    
+    Integer and float rasters give the same result as comparing against each
+    code: negative, fractional and NaN values are unmapped (0).
+    """
+    
+    if esa_data.dtype == np.uint8:
+        return lut[esa_data]
+    
+    valid = esa_data >= 0
+    if np.issubdtype(esa_data.dtype, np.floating):
+        valid &= esa_data == np.floor(esa_data)  # False for NaN
+    
+    codes = np.clip(np.where(valid, esa_data, 0), 0, lut.size - 1).astype(np.intp)
+    simple_data = lut[codes]
+    simple_data[~valid] = 0
+    return simple_data
+
 def convert_esa_to_simple(input_path, output_path, mapping=None):
     """
     Convert ESA CCI raster to Simple 4-class classification
@@ -92,13 +124,10 @@ def convert_esa_to_simple(input_path, output_path, mapping=None):
         # Read the ESA data
         esa_data = src.read(1)
         
-        # Create output array initialized to 0 (Other/No Data)
-        simple_data = np.zeros_like(esa_data, dtype=np.uint8)
-        
-        # Apply mapping
-        for esa_code, simple_code in mapping.items():
-            mask = (esa_data == esa_code)
-            simple_data[mask] = simple_code
+        # Apply mapping in one gather through the lookup table, rather than
+        # one full-raster comparison per ESA code (unmapped codes become 0,
+        # Other/No Data)
+        simple_data = map_esa_codes(esa_data, mapping_lut(mapping))
         
         # Copy metadata and update
         profile = src.profile.copy()
@@ -17,28 +17,55 @@ This will:
 import sys
 from pathlib import Path
 
+SCENARIOS_DIR = Path("scenarios/UKNatureFrontierWithAir/United Kingdom/ScenarioMaps")
+
+def setup(scenario_name):
+    """
+    Setup the UK scenario scenario_name for processing in the current directory
+    
+    Importable entry point for drivers that process several scenarios in one
+    Python process. Writes grid.tif and inputs/gblulcg20_10000.tif (backing up
+    the originals).
+    
+    Raises:
+        FileNotFoundError: If the scenario map does not exist
+        RuntimeError: If the resulting setup does not verify
+    """
+    scenario_file = SCENARIOS_DIR / f"{scenario_name}.tif"
+    if not scenario_file.exists():
+        raise FileNotFoundError(f"Scenario file not found: {scenario_file}")
+    
+    from scenario_scripts.uk_processing_setup import setup_uk_processing_environment, verify_uk_setup
+    
+    # Setup the processing environment
+    result = setup_uk_processing_environment(scenario_file, backup_originals=True)
+    
+    # Verify setup
+    if not verify_uk_setup():
+        raise RuntimeError(f"UK setup for {scenario_name} failed verification")
+    
+    return result
+
 def main():
     if len(sys.argv) != 2:
         print("Usage: python setup_uk_scenario.py <scenario_name>")
         print("\nAvailable scenarios:")
         
-        scenarios_dir = Path("scenarios/UKNatureFrontierWithAir/United Kingdom/ScenarioMaps")
-        if scenarios_dir.exists():
-            for tif_file in scenarios_dir.glob("*.tif"):
+        if SCENARIOS_DIR.exists():
+            for tif_file in SCENARIOS_DIR.glob("*.tif"):
                 print(f"  - {tif_file.stem}")
         else:
-            print(f"  Error: {scenarios_dir} not found")
+            print(f"  Error: {SCENARIOS_DIR} not found")
         
         sys.exit(1)
     
     scenario_name = sys.argv[1]
-    scenarios_dir = Path("scenarios/UKNatureFrontierWithAir/United Kingdom/ScenarioMaps")
-    scenario_file = scenarios_dir / f"{scenario_name}.tif"
+    scenario_file = SCENARIOS_DIR / f"{scenario_name}.tif"
     
     if not scenario_file.exists():
         print(f"Error: Scenario file not found: {scenario_file}")
         print(f"\nAvailable scenarios:")
-        for tif_file in scenarios_dir.glob("*.tif"):
+        for tif_file in SCENARIOS_DIR.glob("*.tif"):
             print(f"  - {tif_file.stem}")
         sys.exit(1)
     
@@ -46,32 +73,23 @@ def main():
     print("=" * 50)
     
     try:
-        # Import the setup utility
-        from scenario_scripts.uk_processing_setup import setup_uk_processing_environment, verify_uk_setup
-        
-        # Setup the processing environment
-        result = setup_uk_processing_environment(scenario_file, backup_originals=True)
-        
-        # Verify setup
-        success = verify_uk_setup()
-        
-        if success:
-            print(f"\n🎉 Setup complete! Ready to process scenario: {scenario_name}")
-            print(f"\nNext steps:")
-            print(f"  python run_dust_emissions.py")
-            print(f"  python run_soil_nox_emissions.py") 
-            print(f"  python run_deposition_calculation.py")
-            print(f"\nOutput will be saved to: outputs/")
-            print(f"To restore original global files: python restore_global_setup.py")
-        else:
-            print(f"\n❌ Setup failed - please check errors above")
-            sys.exit(1)
-            
+        setup(scenario_name)
+    except RuntimeError:
+        print(f"\n❌ Setup failed - please check errors above")
+        sys.exit(1)
     except Exception as e:
         print(f"\n❌ Setup error: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    
+    print(f"\n🎉 Setup complete! Ready to process scenario: {scenario_name}")
+    print(f"\nNext steps:")
+    print(f"  python run_dust_emissions.py")
+    print(f"  python run_soil_nox_emissions.py") 
+    print(f"  python run_deposition_calculation.py")
+    print(f"\nOutput will be saved to: outputs/")
+    print(f"To restore original global files: python restore_global_setup.py")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test the ESA CCI to Simple lookup-table mapping on integer and float rasters
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from scenario_scripts.esa_to_simple_converter import mapping_lut, map_esa_codes
+
+MAPPING = {0: 0, 10: 1, 130: 2, 60: 3, 210: 0}
+
+def expected_classes(esa_data):
+    """Reference result: one comparison per ESA code, as the converter used to do"""
+    simple_data = np.zeros(esa_data.shape, dtype=np.uint8)
+    for esa_code, simple_code in MAPPING.items():
+        simple_data[esa_data == esa_code] = simple_code
+    return simple_data
+
+def test_integer_input():
+    """uint8 and wider integer rasters map like the per-code comparison"""
+    esa_data = np.array([[0, 10, 130], [60, 210, 50]], dtype=np.uint8)
+    lut = mapping_lut(MAPPING)
+    
+    assert np.array_equal(map_esa_codes(esa_data, lut), expected_classes(esa_data))
+    
+    wide = np.array([[10, -1, 130], [60, 1000, 50]], dtype=np.int16)
+    assert np.array_equal(map_esa_codes(wide, lut), expected_classes(wide))
+    return True
+
+def test_float_input():
+    """Float rasters map without IndexError; fractional, negative and NaN values are 0"""
+    esa_data = np.array([[10.0, 130.0, 60.0], [10.5, -10.0, np.nan], [210.0, 999.0, 0.0]],
+                        dtype=np.float32)
+    lut = mapping_lut(MAPPING)
+    
+    simple_data = map_esa_codes(esa_data, lut)
+    
+    assert simple_data.dtype == np.uint8
+    assert np.array_equal(simple_data, expected_classes(esa_data))
+    return True
+
+if __name__ == "__main__":
+    results = {
+        "Integer input": test_integer_input(),
+        "Float input": test_float_input(),
+    }
+    for name, passed in results.items():
+        print(f"{name}: {'✅ PASS' if passed else '❌ FAIL'}")
+    sys.exit(0 if all(results.values()) else 1)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Dust emissions for all UK scenarios in one pass over the meteorology
+
+Meteorology and soil texture do not depend on land use; only the z0 effect
+does. So each scenario is set up just long enough to calculate its aligned
+z0 effect, and then a single pass over the year reads each day's
+meteorology once and adds every scenario's flux to its own annual total
+(dust_landuse_flux_calc.sum_scenario_fluxes). No daily flux rasters are
+written or summed, unlike running the split pipeline once per scenario.
+
+All scenarios must share the UK grid (the same extent), as they do for
+legacy/run_dust_uk_split_optimized.py, which reuses one set of meteorology.
+
+Run from anywhere; paths are resolved from the project root:
+    python utils/run_dust_uk_single_pass.py
+
+Saves results in: outputs/uk_results/scenario_name/dust_emissions.tif
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import rasterio
+import pygeoprocessing.geoprocessing as geop
+
+# Project root (parent of utils/), for the imports below and the relative
+# inputs/, intermediate/ and outputs/ paths used by the dust steps
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from setup_uk_scenario import setup as setup_scenario
+from dust_scripts import dust_1_soil_texture
+from dust_scripts import dust_meteorology_preprocessing
+from dust_scripts import dust_landuse_flux_calc
+from dust_scripts.dust_3_sum import conversion_factor
+from dust_scripts.dust_flux_sum import write_scaled_sum
+
+inputdir = "."  # project root after main() changes into it (contains inputs folder)
+
+# Aligned daily meteorology for 2021 (shared with the split driver)
+METEOROLOGY_STORE = "intermediate/daily_meteorology.zarr"
+
+# All UK scenarios
+UK_SCENARIOS = [
+    "all_econ",
+    "all_urban",
+    "extensification_bmps_irrigated",
+    "extensification_bmps_rainfed",
+    "extensification_current_practices",
+    "extensification_intensified_irrigated",
+    "extensification_intensified_rainfed",
+    "fixedarea_bmps_irrigated",
+    "fixedarea_bmps_rainfed",
+    "fixedarea_intensified_irrigated",
+    "fixedarea_intensified_rainfed",
+    "forestry_expansion",
+    "grazing_expansion",
+    "restoration",
+    "sustainable_current"
+]
+
+def scenario_z0_effects(scenarios):
+    """
+    Set up each scenario in turn and keep its aligned z0 effect array
+
+    Returns:
+        tuple: (dict of scenario -> z0 effect, grid transform)
+
+    Raises:
+        ValueError: If a scenario's grid differs from the first one's
+    """
+    z0_effects = {}
+    reference_grid = None
+
+    for i, scenario in enumerate(scenarios, 1):
+        print(f"🌍 [{i}/{len(scenarios)}] Land use effects for {scenario}")
+        setup_scenario(scenario)
+
+        grid_info = geop.get_raster_info("grid.tif")
+        grid_key = (grid_info['raster_size'], grid_info['geotransform'])
+        if reference_grid is None:
+            reference_grid = grid_key
+        elif grid_key != reference_grid:
+            raise ValueError(f"{scenario} is not on the same grid as {scenarios[0]}")
+
+        aligned_z0_path = dust_landuse_flux_calc.aligned_z0_effect(inputdir, grid_info)
+        with rasterio.open(aligned_z0_path) as src:
+            z0_effects[scenario] = src.read(1)
+            transform = src.transform
+
+    return z0_effects, transform
+
+def main():
+    """Process dust emissions for all UK scenarios in one pass"""
+
+    print("🚀 DUST EMISSIONS FOR ALL UK SCENARIOS (SINGLE PASS)")
+    print("=" * 70)
+
+    os.chdir(PROJECT_ROOT)
+
+    results_dir = Path("outputs/uk_results")
+    results_dir.mkdir(parents=True, exist_ok=True)
+
+    start_time = time.time()
+
+    # Land use effects per scenario; this also leaves grid.tif set to the UK grid
+    z0_effects, transform = scenario_z0_effects(UK_SCENARIOS)
+
+    # Land-use independent inputs, created once
+    if not os.path.exists("intermediate/soil_texture.tif"):
+        print("🔧 Creating soil texture (one-time setup)")
+        dust_1_soil_texture.run(inputdir)
+    if not dust_meteorology_preprocessing.meteorology_store_complete(METEOROLOGY_STORE):
+        print("🌦️  Processing meteorology for full year 2021 (one-time setup)")
+        dust_meteorology_preprocessing.run(inputdir, store_path=METEOROLOGY_STORE)
+
+    print(f"📊 Summing daily dust fluxes for {len(z0_effects)} scenarios...")
+    totals = dust_landuse_flux_calc.sum_scenario_fluxes(
+        z0_effects, meteorology_store=METEOROLOGY_STORE)
+
+    factor = conversion_factor(transform)
+    for scenario, total in totals.items():
+        scenario_dir = results_dir / scenario
+        scenario_dir.mkdir(exist_ok=True)
+        output_path = scenario_dir / "dust_emissions.tif"
+        write_scaled_sum(total, factor, str(output_path), transform, 'EPSG:4326')
+        print(f"      Saved: {scenario}/dust_emissions.tif")
+
+    duration = time.time() - start_time
+    print(f"\n🎉 {len(totals)} scenarios completed in {duration:.1f}s ({duration/60:.1f} minutes)")
+    print(f"  📁 Check results: {results_dir}/")
+
+if __name__ == "__main__":
+    main()